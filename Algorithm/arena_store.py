@@ -0,0 +1,166 @@
+from typing import Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from constants import Obstacle
+from map import Map
+from setup_logger import logger
+
+# File layout: a HEADER_DTYPE header, followed by `count` fixed-size records of `arena_dtype(...)`.
+# Fixed-size records let a corpus be memory-mapped as one array, and any arena be read without parsing the others
+MAGIC = b"MDPARENA"
+VERSION = 1
+
+HEADER_DTYPE = np.dtype(
+    [
+        ("magic", "S8"),
+        ("version", "<u2"),
+        ("rows", "<u2"),
+        ("cols", "<u2"),
+        ("max_obstacles", "<u2"),
+        ("count", "<u4"),
+    ]
+)
+
+OBSTACLE_DTYPE = np.dtype(
+    [("id", "<u2"), ("x", "<u2"), ("y", "<u2"), ("direction", "i1")]
+)
+
+
+def arena_dtype(rows: int, cols: int, max_obstacles: int) -> np.dtype:
+    """
+    Returns the record of one arena - its grid (see the legend in map.py), and the obstacles it was built from.
+    Every record has room for `max_obstacles` obstacles - unused slots are ignored, as the record holds the number
+    of obstacles
+    """
+    return np.dtype(
+        [
+            ("grid", "i1", (rows, cols)),
+            ("n_obstacles", "<u2"),
+            ("obstacles", OBSTACLE_DTYPE, (max_obstacles,)),
+        ]
+    )
+
+
+def save_arenas(
+    path: str, arenas: Iterable[Map], max_obstacles: Optional[int] = None
+) -> int:
+    """
+    Writes `arenas` to `path` as an arena corpus. Every arena must have the same dimensions and at most
+    `max_obstacles` obstacles. If `max_obstacles` is None, the records are sized for the arena with the most
+    obstacles, so `arenas` is read in full first - pass it to write the arenas one at a time as they are generated
+
+    Returns the number of arenas written
+    """
+    if max_obstacles is None:
+        arenas = list(arenas)
+        max_obstacles = max((len(arena.obstacles) for arena in arenas), default=0)
+
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header["magic"], header["version"] = MAGIC, VERSION
+    header["max_obstacles"] = max_obstacles
+
+    count = 0
+    with open(path, "wb") as file:
+        # the header is rewritten once the dimensions and count are known
+        file.write(header.tobytes())
+        record = None
+        for arena in arenas:
+            if record is None:
+                rows, cols = arena.grid.shape
+                header["rows"], header["cols"] = rows, cols
+                record = np.zeros(1, dtype=arena_dtype(rows, cols, max_obstacles))
+            if arena.grid.shape != record["grid"].shape[1:]:
+                raise ValueError(
+                    f"Arena {count} is {arena.grid.shape}, but the corpus holds {record['grid'].shape[1:]} arenas"
+                )
+            if len(arena.obstacles) > max_obstacles:
+                raise ValueError(
+                    f"Arena {count} has {len(arena.obstacles)} obstacles, but at most {max_obstacles} can be stored"
+                )
+
+            record.fill(0)
+            record["grid"] = arena.grid
+            record["n_obstacles"] = len(arena.obstacles)
+            for i, obstacle in enumerate(arena.obstacles):
+                record["obstacles"][0, i] = (
+                    obstacle.id,
+                    obstacle.x,
+                    obstacle.y,
+                    obstacle.direction,
+                )
+            file.write(record.tobytes())
+            count += 1
+
+        header["count"] = count
+        file.seek(0)
+        file.write(header.tobytes())
+
+    logger.debug(f"Saved {count} arenas to {path}")
+    return count
+
+
+class ArenaCorpus:
+    """
+    Class to represent an arena corpus written by `save_arenas`, memory-mapped so that only the arenas that are used
+    are read from disk
+
+    records is the memory-mapped array of `arena_dtype` records, e.g. records["grid"] is every grid in the corpus
+
+    Usage:
+        corpus = ArenaCorpus("arenas.bin")
+        for arena in corpus:  # or corpus[i]
+            robot.fastestPath(arena.grid)
+    """
+
+    def __init__(self, path: str):
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        if len(header) == 0 or header["magic"][0] != MAGIC:
+            raise ValueError(f"{path} is not an arena corpus")
+        if header["version"][0] != VERSION:
+            raise ValueError(
+                f"{path} is a version {header['version'][0]} arena corpus, but only version {VERSION} can be read"
+            )
+
+        self.path = path
+        self.rows, self.cols = int(header["rows"][0]), int(header["cols"][0])
+        self.max_obstacles = int(header["max_obstacles"][0])
+        count = int(header["count"][0])
+        # np.memmap cannot map an empty array
+        self.records: np.ndarray = (
+            np.memmap(
+                path,
+                dtype=arena_dtype(self.rows, self.cols, self.max_obstacles),
+                mode="r",
+                offset=HEADER_DTYPE.itemsize,
+                shape=(count,),
+            )
+            if count
+            else np.zeros(
+                0, dtype=arena_dtype(self.rows, self.cols, self.max_obstacles)
+            )
+        )
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def grid(self, index: int) -> np.ndarray:
+        """Returns the grid of the `index`th arena, as a read-only view of the file"""
+        return self.records["grid"][index]
+
+    def obstacles(self, index: int) -> List[Obstacle]:
+        record = self.records[index]
+        return [
+            Obstacle(int(obstacle_id), int(x), int(y), int(direction))
+            for obstacle_id, x, y, direction in record["obstacles"][
+                : record["n_obstacles"]
+            ]
+        ]
+
+    def __getitem__(self, index: int) -> Map:
+        """Returns the `index`th arena as a Map, ready to plan on"""
+        return Map(self.grid(index), self.obstacles(index))
+
+    def __iter__(self) -> Iterator[Map]:
+        for index in range(len(self)):
+            yield self[index]
@@ -1,14 +1,71 @@
+import asyncio
+import concurrent.futures
 import socket
-import time
-from typing import List, Tuple
+import threading
+from typing import AsyncIterator, Awaitable, Iterator, List, Optional, Tuple
 
+import config
 from constants import Direction, Obstacle
 from setup_logger import logger
 
+# default timeout of the AsyncCommunication coroutines, which stands for the client's own timeout
+CLIENT_TIMEOUT = object()
+
+
+def parse_obstacles(data: str) -> List[Obstacle]:
+    """Parses an obstacle list sent via Android, skipping (and logging) any invalid obstacle
+
+    Sample input `data` from RPi
+    "0,1,3,N,19,10,S,1,12,13,E,11,0,W" - each obstacle is represented by a comma-separated string of index,x,y,direction
+    """
+    obstacles = data.split(",")
+    new_obstacles = []
+    for i in range(0, len(obstacles), 4):
+        index, x, y, direction = obstacles[i : i + 4]
+
+        # (height - 1 - y) to convert from arena's representation which treats bottom-left as (0,0)
+        # to our representation which treats top-left as (0, 0)
+        width, height = config.map_size["width"], config.map_size["height"]
+        index, x, y = (
+            int(index.strip()),
+            int(x.strip()),
+            height - 1 - int(y.strip()),
+        )
+        direction = direction.strip()
+        direction = (
+            10
+            if direction == Direction.NORTH.value
+            else 12
+            if direction == Direction.SOUTH.value
+            else 11
+            if direction == Direction.EAST.value
+            else 13
+            if direction == Direction.WEST.value
+            else None
+        )
+
+        if not (0 <= x < width and 0 <= y < height and direction is not None):
+            logger.error(
+                f"Invalid obstacle '{obstacles[i: i + 4]}'. Coordinates are out of bounds [0, {width - 1}] x [0, {height - 1}] or direction is invalid. Resend the obstacle list"
+            )
+            continue
+
+        new_obstacles.append(Obstacle(index, x, y, direction))
+
+    logger.debug(
+        f"Client parsed obstacles from server: {new_obstacles}. Obstacle coordinates treat TOP-LEFT as (0, 0)"
+    )
+    return new_obstacles
+
 
 class Communication:
     """
     A TCP socket (Algo) client to communiacate the TCP socket (RPi) server listening at (self.ipv4, self.port)
+
+    Wire contract - every message, in both directions, is UTF-8 text ending with a single newline (b"\n"), e.g.
+    b"w010\n" to the RPi and b"ACK\n" back. A message never contains a newline itself, and empty messages are ignored.
+    The RPi must end every message it sends with a newline - a reply without one is never complete, so the client
+    keeps waiting for the rest of it
     """
 
     def __init__(self):
@@ -22,7 +79,14 @@ class Communication:
         )  # the socket object used for 2-way TCP communication with the RPi
         self.msg: str = None  # message received from the Rpi
         self.msg_format: str = "utf-8"  # message format for sending (encoding to a UTF-8 byte sequence) and receiving (decoding a UTF-8 byte sequence) data from the Rpi
-        self.read_limit_bytes: int = 2048  # number of bytes to read from the socket in a single blocking socket.recv command
+        self.read_limit_bytes: int = 2048  # number of bytes to read from the socket in a single blocking socket.recv_into command
+        self.delimiter: bytes = b"\n"  # every message to and from the RPi ends with this delimiter
+        self.recv_buffer: bytearray = bytearray(
+            self.read_limit_bytes
+        )  # reused by every socket.recv_into, so receiving does not allocate
+        self.pending: bytearray = (
+            bytearray()
+        )  # bytes received after the last complete message, i.e. the start of the next message(s)
 
     def connect(self) -> None:
         """
@@ -48,16 +112,47 @@ class Communication:
         logger.debug(f"Algo client socket has been closed")
 
     def send_message(self, message: str) -> None:
-        """Sends string data to the RPi
+        """Sends string data to the RPi, followed by the delimiter that ends every message
 
         Args:
-            message (str): the unencoded raw string to send to the RPi
+            message (str): the unencoded raw string to send to the RPi, without the delimiter
         """
         server_ipv4, server_port = self.socket.getpeername()
         logger.debug(
             f"[ALGO SEND] Client is sending '{message}' to server at {server_ipv4}:{server_port}"
         )
-        self.socket.send(str(message).encode(self.msg_format))
+        # sendall, as a partly sent message would run into the next one
+        self.socket.sendall(str(message).encode(self.msg_format) + self.delimiter)
+
+    def receive_message(self) -> str:
+        """Blocks until a complete message has been received from the RPi, and returns it without its delimiter
+
+        Messages may arrive split across several TCP segments, or several to a segment (e.g. an ACK followed by the
+        next message), so bytes are buffered until a delimiter arrives. Empty messages are skipped
+
+        Raises:
+            ConnectionError: if the server closes the connection before a complete message arrives
+        """
+        while True:
+            end = self.pending.find(self.delimiter)
+            if end != -1:
+                message = self.pending[:end].decode(self.msg_format).strip()
+                del self.pending[: end + len(self.delimiter)]
+                if message:
+                    return message
+                continue
+
+            received = self.socket.recv_into(self.recv_buffer)
+            if received == 0:
+                raise ConnectionError(
+                    f"Server closed the connection with {len(self.pending)} bytes of an incomplete message: '{bytes(self.pending)}'"
+                )
+            self.pending += memoryview(self.recv_buffer)[:received]
+
+    def messages(self) -> Iterator[str]:
+        """Yields every message from the RPi as soon as it is complete - see `receive_message`"""
+        while True:
+            yield self.receive_message()
 
     def get_obstacles(self) -> List[Obstacle]:
         """Returns the list of obstacles sent via Android
@@ -70,79 +165,178 @@ class Communication:
         """
         logger.debug("Client is waiting for the server to send the obstacles list")
 
-        while True:
-            logger.debug("[BLOCKING] Client listening for data from server...")
-            data = self.socket.recv(self.read_limit_bytes).strip()
-
-            if len(data) > 0:
-                data = data.decode(self.msg_format)
-                logger.debug(f"Client received obstacles from server: '{data}'")
-                obstacles = data.split(",")
-                new_obstacles = []
-                for i in range(0, len(obstacles), 4):
-                    index, x, y, direction = obstacles[i : i + 4]
-
-                    # (19 - y) to convert from arena's representation which treats bottom-left as (0,0)
-                    # to our representation which treats top-left as (0, 0)
-                    index, x, y = (
-                        int(index.strip()),
-                        int(x.strip()),
-                        19 - int(y.strip()),
-                    )
-                    direction = direction.strip()
-                    direction = (
-                        10
-                        if direction == Direction.NORTH.value
-                        else 12
-                        if direction == Direction.SOUTH.value
-                        else 11
-                        if direction == Direction.EAST.value
-                        else 13
-                        if direction == Direction.WEST.value
-                        else None
-                    )
-
-                    if not (0 <= x <= 19 and 0 <= y <= 19 and direction is not None):
-                        logger.error(
-                            f"Invalid obstacle '{obstacles[i: i + 4]}'. Coordinates are out of bounds [0, 19] or direction is invalid. Resend the obstacle list"
-                        )
-                        continue
-
-                    new_obstacles.append(Obstacle(index, x, y, direction))
-
-                logger.debug(
-                    f"Client parsed obstacles from server: {new_obstacles}. Obstacle coordinates treat TOP-LEFT as (0, 0)"
-                )
-                return new_obstacles
-
-            logger.warn(
-                f"Server received empty data from client: '{data}'. Sleeping for 1 second..."
-            )
-            time.sleep(1)
+        logger.debug("[BLOCKING] Client listening for data from server...")
+        data = self.receive_message()
+        logger.debug(f"Client received obstacles from server: '{data}'")
+        return parse_obstacles(data)
 
     def listen_to_rpi(self):
         """
-        Reads at most `self.read_limit_bytes` bytes from the server and saves the data into `self.msg`
+        Reads the next complete message from the server and saves it into `self.msg`
         """
         logger.debug("[BLOCKING] Client listening for data from server...")
+        self.msg = self.receive_message()
+        logger.debug(f"[ALGO RCV] Client received data from server: '{self.msg}'")
 
-        while True:
-            msg = self.socket.recv(self.read_limit_bytes).strip()
+    def communicate(self, data: str, listen=True, write=True):
+        if write and data:
+            self.send_message(data)
+        if listen:
+            self.listen_to_rpi()
 
-            if msg:
-                self.msg = msg.decode(self.msg_format)
-                logger.debug(
-                    f"[ALGO RCV] Client received data from server: '{self.msg}'"
-                )
-                return
 
-            logger.debug(
-                f"[ALGO RCV] Client is waiting for data from server but received: '{self.msg}'. Sleeping for 1 second..."
+class AsyncCommunication:
+    """
+    An asyncio TCP socket (Algo) client to communicate with the TCP socket (RPi) server listening at (self.ipv4, self.port)
+
+    It speaks the same newline-delimited protocol as `Communication` (see its wire contract), but waiting for the RPi
+    never blocks the event loop, so other coroutines (e.g. UI updates) run in the meantime. Every wait gives up after
+    `timeout` seconds with an asyncio.TimeoutError, and every coroutine can be cancelled
+
+    Usage:
+        client = AsyncCommunication()
+        await client.connect()
+        obstacles = await client.get_obstacles()
+        ack = await client.communicate("w010")
+    """
+
+    def __init__(self, timeout: Optional[float] = config.comms_timeout):
+        # self.ipv4 = "192.168.33.1" # TODO - comment on actual run
+        self.ipv4: str = socket.gethostbyname(socket.gethostname())
+        self.port: int = 5000  # port the server is listening on for new connections
+        self.timeout: Optional[float] = timeout  # seconds to wait for the RPi, or None to wait forever
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.msg: str = None  # message received from the Rpi
+        self.msg_format: str = "utf-8"  # see `Communication`
+        self.delimiter: bytes = b"\n"  # every message to and from the RPi ends with this delimiter
+
+    @property
+    def connected(self) -> bool:
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def connect(self) -> None:
+        """
+        Initiates a TCP socket connection to the server at (self.ipv4, self.port)
+        """
+        logger.debug(f"Connecting to the server at {self.ipv4}:{self.port}...")
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.ipv4, self.port), self.timeout
+        )
+        logger.debug(f"Successfully connected to the server at {self.ipv4}:{self.port}")
+
+    async def disconnect(self) -> None:
+        if not self.connected:
+            logger.warning(
+                "There is no active connection with a server currently. Unable to disconnect."
             )
-            time.sleep(1)
+            return
 
-    def communicate(self, data: str, listen=True, write=True):
+        logger.debug(f"Disconnecting from the server at {self.ipv4}:{self.port}...")
+        self.writer.close()
+        try:
+            await asyncio.wait_for(self.writer.wait_closed(), self.timeout)
+        except (ConnectionError, asyncio.TimeoutError) as e:
+            logger.warning(f"Connection did not close cleanly: {e!r}")
+        self.reader = self.writer = None
+        logger.debug(f"Algo client connection has been closed")
+
+    async def send_message(self, message: str) -> None:
+        """Sends string data to the RPi followed by the delimiter, waiting until it has been handed over to the OS if
+        the send buffer is full
+        """
+        logger.debug(f"[ALGO SEND] Client is sending '{message}' to server")
+        self.writer.write(str(message).encode(self.msg_format) + self.delimiter)
+        await asyncio.wait_for(self.writer.drain(), self.timeout)
+
+    async def receive_message(self, timeout: Optional[float] = CLIENT_TIMEOUT) -> str:
+        """Returns the next complete message from the RPi without its delimiter, skipping empty messages
+
+        Args:
+            timeout (Optional[float]): seconds to wait for the message, instead of `self.timeout`
+
+        Raises:
+            asyncio.TimeoutError: if no message arrives in time
+            ConnectionError: if the server closes the connection before a complete message arrives
+        """
+        timeout = self.timeout if timeout is CLIENT_TIMEOUT else timeout
+        while True:
+            try:
+                frame = await asyncio.wait_for(
+                    self.reader.readuntil(self.delimiter), timeout
+                )
+            except asyncio.IncompleteReadError as e:
+                raise ConnectionError(
+                    f"Server closed the connection with {len(e.partial)} bytes of an incomplete message: '{e.partial}'"
+                ) from e
+            message = frame[: -len(self.delimiter)].decode(self.msg_format).strip()
+            if message:
+                return message
+
+    async def messages(self) -> AsyncIterator[str]:
+        """Yields every message from the RPi as soon as it is complete, however long it takes to arrive"""
+        while True:
+            yield await self.receive_message(timeout=None)
+
+    async def get_obstacles(
+        self, timeout: Optional[float] = CLIENT_TIMEOUT
+    ) -> List[Obstacle]:
+        """Returns the list of obstacles sent via Android - see `parse_obstacles`"""
+        logger.debug("Client is waiting for the server to send the obstacles list")
+        data = await self.receive_message(timeout)
+        logger.debug(f"Client received obstacles from server: '{data}'")
+        return parse_obstacles(data)
+
+    async def communicate(self, data: str, listen=True, write=True) -> Optional[str]:
+        """Sends `data` if `write`, then returns the reply (also saved into `self.msg`) if `listen`"""
         if write and data:
-            self.send_message(data)
+            await self.send_message(data)
         if listen:
-            self.listen_to_rpi()
+            self.msg = await self.receive_message()
+            logger.debug(f"[ALGO RCV] Client received data from server: '{self.msg}'")
+            return self.msg
+        return None
+
+
+class BackgroundEventLoop:
+    """
+    Class to represent an asyncio event loop running in a daemon thread, so that coroutines can be started from
+    synchronous code such as Tk callbacks without blocking it
+
+    Usage:
+        loop = BackgroundEventLoop()
+        future = loop.submit(client.connect())  # a concurrent.futures.Future
+        future.cancel()  # cancels the coroutine
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, name="comms", daemon=True
+        )
+        self.thread.start()
+
+    def submit(self, coroutine: Awaitable) -> concurrent.futures.Future:
+        """Schedules `coroutine` on the loop, and returns a future of its result. Exceptions are also logged"""
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        future.add_done_callback(self._log_exception)
+        return future
+
+    @staticmethod
+    def _log_exception(future: concurrent.futures.Future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Background task failed: {future.exception()!r}")
+
+    def stop(self) -> None:
+        """Cancels every coroutine still running, then stops the loop and its thread"""
+
+        async def cancel_tasks():
+            tasks = asyncio.all_tasks() - {asyncio.current_task()}
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(cancel_tasks(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
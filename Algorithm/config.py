@@ -2,6 +2,56 @@ from constants import Direction
 
 map_size = dict(height=20, width=20)
 
+# seconds comms.AsyncCommunication waits to connect to, send to, or hear back from the RPi before giving up, or None
+# to wait forever. The simulator always waits for the STM's ACKs, which take as long as the movement
+comms_timeout = 10
+
+# milliseconds between the simulator's checks for UI updates queued by the RPi communication
+ui_poll_ms = 20
+
+# pixels per cell drawn by the simulator - lower it for large arenas
+cell_size = 40
+
+# algorithm used to order the waypoints - one of the fastest_path_algo.TourSolver values ("branch_and_bound",
+# "parallel_branch_and_bound", "held_karp", "heuristic", "auto")
+tour_solver = "auto"
+
+# number of processes the "parallel_branch_and_bound" tour solver uses, or None for one per CPU
+tour_workers = None
+
+# largest number of waypoints (not counting the start) the "auto" tour solver orders exactly, before switching to the
+# heuristic - 15 covers a full arena of obstacles
+exact_tour_max_waypoints = 15
+
+# seconds the heuristic tour solver may spend improving the order of the waypoints
+tour_time_budget = 0.2
+
+# maximum number of planned legs kept in plan_cache.leg_cache
+leg_cache_size = 256
+
+# search engine used to plan every leg - one of the path_find_algo.SearchEngine values ("astar", "jps", "bidirectional")
+search_engine = "astar"
+
+# inflation of the search heuristic - every leg costs at most search_epsilon times the optimal cost, 1.0 keeps them optimal
+search_epsilon = 1.0
+
+# maximum number of states a search may expand for a single leg before it gives up - at least every state of the arena
+search_node_budget = max(100000, 8 * map_size["height"] * map_size["width"])
+
+# guide searches with the exact path_find_algo.CostToGo field of each goal, computed once per arena and goal
+search_cost_to_go = False
+
+# width and height (in cells) of the sectors of hierarchical_path_algo.HierarchicalPlanner
+hierarchical_sector_size = 10
+
+# arenas with at least this many cells plan the legs the waypoints' shortest path trees cannot serve (e.g. after the
+# robot stopped short of a waypoint) with hierarchical_path_algo.HierarchicalPlanner instead of find_path, or None to
+# never do so. On random arenas of up to 200x200 cells it was no faster than find_path, and its legs cost more
+hierarchical_min_cells = None
+
+# repair the previous run's search with incremental_path_algo.DStarLite when the arena changes, instead of planning from scratch
+incremental_replanning = True
+
 map_cells_1 = [[0 for _ in range(map_size["width"])] for _ in range(map_size["height"])]
 map_cells_2 = [[0 for _ in range(map_size["width"])] for _ in range(map_size["height"])]
 image_paths = dict(
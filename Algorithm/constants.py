@@ -63,6 +63,11 @@ class Bearing(IntEnum):
     def is_diag_bearing(current_bearing):
         return current_bearing.value % 2 == 1
 
+    @staticmethod
+    def to_cardinal(current_bearing):
+        """Returns the bearing itself if it is cardinal, otherwise the cardinal bearing 45 deg anticlockwise of it"""
+        return Bearing(current_bearing.value - current_bearing.value % 2)
+
     @staticmethod
     def int_to_bearing(bearing: int):
         """Converts an integer to a Bearing enum object
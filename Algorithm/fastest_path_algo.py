@@ -1,33 +1,383 @@
 import math
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+from typing import List, Optional, Tuple
+
 import numpy as np
 
+import config
+from setup_logger import logger
+
+
+class TourSolver(Enum):
+    """The algorithms `FastestPath.plan_path` can order the waypoints with"""
+
+    # recursive branch and bound with minimum spanning tree bounds - exact
+    BRANCH_AND_BOUND = "branch_and_bound"
+    # the same branch and bound, split by the first two waypoints across config.tour_workers processes - exact
+    PARALLEL_BRANCH_AND_BOUND = "parallel_branch_and_bound"
+    # Held-Karp bitmask dynamic programming - exact, in O(2^n n^2) time
+    HELD_KARP = "held_karp"
+    # nearest neighbour then 2-opt and Or-opt local search, within config.tour_time_budget - not always optimal
+    HEURISTIC = "heuristic"
+    # HELD_KARP up to config.exact_tour_max_waypoints waypoints after the start, HEURISTIC beyond
+    AUTO = "auto"
+
 
 class FastestPath:
     def __init__(self):
         self.min_cost = 10000
         self.path = []
+        # the solver the last plan_path actually used
+        self.mode: Optional[TourSolver] = None
+        # best cost found by any process, when the branch and bound is split across processes
+        self.shared_bound = None
+
+    @staticmethod
+    def path_cost(dist, path: List[int]) -> float:
+        return sum(dist[i][j] for i, j in zip(path, path[1:]))
+
+    def nearest_neighbour(self, dist, n) -> List[int]:
+        """Returns the path that always drives to the closest waypoint not visited yet, starting from waypoint 0"""
+        path, unvisited = [0], set(range(1, n))
+        while unvisited:
+            closest = min(unvisited, key=lambda i: dist[path[-1]][i])
+            path.append(closest)
+            unvisited.remove(closest)
+        return path
+
+    def two_opt(self, dist, path: List[int], deadline: float = None) -> List[int]:
+        """Improves `path` by reversing any stretch of it that makes it cheaper, until no reversal helps or the
+        `deadline` (a time.perf_counter() value) passes
+
+        Waypoint 0 stays first. The cost of both directions of the stretch is accumulated as it grows, so every
+        candidate is costed in O(1) even when dist is asymmetric
+        """
+        path = list(path)
+        improved = True
+        while improved:
+            improved = False
+            for i in range(1, len(path) - 1):
+                if deadline is not None and time.perf_counter() > deadline:
+                    return path
+                before = path[i - 1]
+                forward = backward = 0
+                for j in range(i + 1, len(path)):
+                    forward += dist[path[j - 1]][path[j]]
+                    backward += dist[path[j]][path[j - 1]]
+                    old_cost = dist[before][path[i]] + forward
+                    new_cost = dist[before][path[j]] + backward
+                    if j + 1 < len(path):
+                        old_cost += dist[path[j]][path[j + 1]]
+                        new_cost += dist[path[i]][path[j + 1]]
+                    if new_cost < old_cost:
+                        path[i : j + 1] = path[i : j + 1][::-1]
+                        improved = True
+                        break
+        return path
+
+    def or_opt(self, dist, path: List[int], deadline: float = None) -> List[int]:
+        """Improves `path` by moving any stretch of 1 to 3 waypoints (in the same direction) to a cheaper place in the
+        path, until no move helps or the `deadline` passes. Waypoint 0 stays first
+        """
+        path = list(path)
+        improved = True
+        while improved:
+            improved = False
+            for length in (1, 2, 3):
+                for i in range(1, len(path) - length + 1):
+                    if deadline is not None and time.perf_counter() > deadline:
+                        return path
+                    segment = path[i : i + length]
+                    rest = path[:i] + path[i + length :]
+                    # cost saved by taking the segment out
+                    saved = dist[path[i - 1]][segment[0]]
+                    if i + length < len(path):
+                        saved += (
+                            dist[segment[-1]][path[i + length]]
+                            - dist[path[i - 1]][path[i + length]]
+                        )
+                    for k in range(len(rest)):
+                        if k == i - 1:
+                            continue
+                        # cost added by putting the segment back right after rest[k]
+                        added = dist[rest[k]][segment[0]]
+                        if k + 1 < len(rest):
+                            added += (
+                                dist[segment[-1]][rest[k + 1]]
+                                - dist[rest[k]][rest[k + 1]]
+                            )
+                        if added < saved:
+                            path = rest[: k + 1] + segment + rest[k + 1 :]
+                            improved = True
+                            break
+                    if improved:
+                        break
+                if improved:
+                    break
+        return path
+
+    def local_search(
+        self, dist, n, time_budget: float = config.tour_time_budget
+    ) -> List[int]:
+        """Returns the best order to visit all `n` waypoints found within `time_budget` seconds, starting at waypoint 0
+
+        The nearest neighbour path is improved with 2-opt and Or-opt until neither helps. While there is time left,
+        the best path is then kicked (a random stretch is moved elsewhere) and improved again
+        """
+        deadline = time.perf_counter() + time_budget
+        rng = random.Random(0)
+
+        def improve(path: List[int]) -> List[int]:
+            while True:
+                cost = self.path_cost(dist, path)
+                path = self.or_opt(dist, self.two_opt(dist, path, deadline), deadline)
+                if self.path_cost(dist, path) >= cost or time.perf_counter() > deadline:
+                    return path
+
+        best = improve(self.nearest_neighbour(dist, n))
+        best_cost = self.path_cost(dist, best)
+        # a few hundred kicks are plenty for the arena sizes we plan for
+        for _ in range(100 * n):
+            if n < 4 or time.perf_counter() > deadline:
+                break
+            i, j = sorted(rng.sample(range(1, n), 2))
+            segment = best[i : j + 1]
+            rest = best[:i] + best[j + 1 :]
+            k = rng.randrange(1, len(rest) + 1)
+            candidate = improve(rest[:k] + segment + rest[k:])
+            candidate_cost = self.path_cost(dist, candidate)
+            if candidate_cost < best_cost:
+                best, best_cost = candidate, candidate_cost
+
+        self.min_cost = best_cost
+        return best
+
+    def lower_bound(self, cur, unvisited: List[int]) -> float:
+        """Returns a lower bound on the cost of visiting all of `unvisited` from `cur`
+
+        Any such path is a spanning tree of `cur` and `unvisited`, so it costs at least their minimum spanning tree.
+        The tree is built with Prim's algorithm over self.undirected, where each pair of waypoints costs the cheaper
+        of its two directions
+        """
+        nodes = [cur] + unvisited
+        costs = self.undirected[np.ix_(nodes, nodes)]
+        in_tree = np.zeros(len(nodes), dtype=bool)
+        in_tree[0] = True
+        # cheapest edge from the tree to every node
+        cheapest = costs[0].copy()
+        total = 0.0
+        for _ in range(len(nodes) - 1):
+            cheapest[in_tree] = np.inf
+            closest = int(np.argmin(cheapest))
+            total += cheapest[closest]
+            in_tree[closest] = True
+            np.minimum(cheapest, costs[closest], out=cheapest)
+        return total
 
     def tsp(self, dist, vis, cur, cnt, n, cost, ans):
+        if self.shared_bound is not None and self.shared_bound.value < self.min_cost:
+            # another process found a cheaper path - prune against it too
+            self.min_cost = self.shared_bound.value
+
         if cnt == n:
             if cost < self.min_cost:
                 self.min_cost = cost
-                self.path = ans
-                return
-        for i in range(n):
-            if vis[i] == False:
-                if cost + dist[cur][i] > self.min_cost:
-                    continue
-                vis[i] = True
-                new_ans = np.zeros(n)
-                for k in range(cnt):
-                    new_ans[k] = ans[k]
-                new_ans[cnt] = i
-                self.tsp(dist, vis, i, cnt + 1, n, cost + dist[cur][i], new_ans)
-                vis[i] = False
-
-    def plan_path(self, dist, n):
+                self.path = list(ans)
+                if self.shared_bound is not None:
+                    with self.shared_bound.get_lock():
+                        self.shared_bound.value = min(self.shared_bound.value, cost)
+            return
+
+        unvisited = [i for i in range(n) if not vis[i]]
+        # No path through this branch can beat the best one found so far
+        if cost + self.lower_bound(cur, unvisited) >= self.min_cost:
+            return
+
+        # Closest waypoints first, so good paths (and tighter bounds) are found early
+        for i in sorted(unvisited, key=lambda i: dist[cur][i]):
+            if cost + dist[cur][i] >= self.min_cost:
+                break
+            vis[i] = True
+            ans.append(i)
+            self.tsp(dist, vis, i, cnt + 1, n, cost + dist[cur][i], ans)
+            ans.pop()
+            vis[i] = False
+
+    def branch_and_bound(self, dist, n) -> List[int]:
+        """Returns the cheapest order to visit all `n` waypoints, starting at waypoint 0 and ending anywhere
+
+        The search starts from the nearest neighbour path improved by 2-opt, so there is always a path to return, and
+        then only explores branches whose minimum spanning tree bound can beat the best path found so far
+        """
+        costs = np.array(dist, dtype=float)
+        self.undirected = np.minimum(costs, costs.T)
+
+        self.path = self.two_opt(dist, self.nearest_neighbour(dist, n))
+        self.min_cost = self.path_cost(dist, self.path)
+
         visited = [False for i in range(n)]
         visited[0] = True
-        ans = np.zeros(n)
-        self.tsp(dist, visited, 0, 1, n, 0, ans)
+        self.tsp(dist, visited, 0, 1, n, 0, [0])
         return self.path
+
+    def parallel_branch_and_bound(
+        self, dist, n, workers: Optional[int] = config.tour_workers
+    ) -> List[int]:
+        """Returns the same order as `branch_and_bound`, searching the branches below every start of the path (its
+        first two waypoints after waypoint 0) in a pool of `workers` processes (all CPUs if None)
+
+        The processes share the cost of the best path found so far, so each prunes with the others' paths as well
+        """
+        if n <= 3:
+            return self.branch_and_bound(dist, n)
+
+        costs = np.array(dist, dtype=float)
+        self.undirected = np.minimum(costs, costs.T)
+
+        self.path = self.two_opt(dist, self.nearest_neighbour(dist, n))
+        self.min_cost = self.path_cost(dist, self.path)
+
+        # Cheapest starts first, dropping the ones that cannot beat the warm start
+        prefixes = []
+        for first in range(1, n):
+            for second in range(1, n):
+                if second == first:
+                    continue
+                prefix = [0, first, second]
+                unvisited = [i for i in range(n) if i not in prefix]
+                bound = self.path_cost(dist, prefix) + self.lower_bound(
+                    second, unvisited
+                )
+                if bound < self.min_cost:
+                    prefixes.append((bound, prefix))
+        prefixes.sort()
+
+        shared_bound = multiprocessing.Value("d", self.min_cost)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_tour_worker,
+            initargs=(dist, shared_bound),
+        ) as executor:
+            for result in executor.map(
+                _solve_tour_prefix, [prefix for _, prefix in prefixes]
+            ):
+                if result is not None and result[0] < self.min_cost:
+                    self.min_cost, self.path = result
+        return self.path
+
+    def held_karp(self, dist, n) -> List[int]:
+        """Returns the cheapest order to visit all `n` waypoints, starting at waypoint 0 and ending anywhere
+
+        dp[mask][j] is the cost of the cheapest path that starts at waypoint 0, visits exactly the waypoints in `mask`
+        and ends at waypoint j, where bit b of `mask` stands for waypoint b + 1. Masks are filled in one layer of set
+        size at a time, and every layer is computed for all its masks at once with NumPy
+        """
+        if n <= 1:
+            self.min_cost = 0
+            return list(range(n))
+
+        costs = np.array(dist, dtype=float)
+        m = n - 1  # waypoints other than the start
+        # cost of going from waypoint i + 1 to waypoint j + 1, where a waypoint cannot follow itself
+        legs = costs[1:, 1:].copy()
+        np.fill_diagonal(legs, np.inf)
+
+        masks = np.arange(1 << m)
+        set_sizes = np.zeros(1 << m, dtype=int)
+        for bit in range(m):
+            set_sizes += (masks >> bit) & 1
+
+        dp = np.full((1 << m, m), np.inf)
+        # the waypoint visited just before the last one, for every (mask, last waypoint)
+        parent = np.full((1 << m, m), -1, dtype=np.int16)
+        dp[1 << np.arange(m), np.arange(m)] = costs[0, 1:]
+
+        for size in range(2, m + 1):
+            layer = masks[set_sizes == size]
+            for last in range(m):
+                ending = layer[(layer >> last) & 1 == 1]
+                # extend every path over `mask` without `last` by the leg to `last`
+                candidates = dp[ending ^ (1 << last)] + legs[:, last]
+                parent[ending, last] = np.argmin(candidates, axis=1)
+                dp[ending, last] = candidates[
+                    np.arange(len(ending)), parent[ending, last]
+                ]
+
+        mask = (1 << m) - 1
+        last = int(np.argmin(dp[mask]))
+        self.min_cost = float(dp[mask, last])
+
+        path = []
+        while last != -1:
+            path.append(last + 1)
+            mask, last = mask ^ (1 << last), int(parent[mask, last])
+        path.append(0)
+        path.reverse()
+        return path
+
+    def plan_path(self, dist, n, solver: TourSolver = None):
+        """Returns the order to visit the `n` waypoints in, starting from waypoint 0, where dist[i][j] is the cost of
+        driving from waypoint i to waypoint j. dist does not need to be symmetric - every solver follows its direction.
+        `solver` defaults to `config.tour_solver`, and self.mode is set to the solver that was used
+        """
+        if solver is None:
+            solver = TourSolver(config.tour_solver)
+        if solver == TourSolver.AUTO:
+            # waypoint 0 is the start, which is not part of the order
+            solver = (
+                TourSolver.HELD_KARP
+                if n - 1 <= config.exact_tour_max_waypoints
+                else TourSolver.HEURISTIC
+            )
+        self.mode = solver
+        logger.debug(f"Ordering {n} waypoints using {solver.value}")
+
+        if solver == TourSolver.HELD_KARP:
+            self.path = self.held_karp(dist, n)
+        elif solver == TourSolver.PARALLEL_BRANCH_AND_BOUND:
+            self.path = self.parallel_branch_and_bound(dist, n)
+        elif solver == TourSolver.HEURISTIC:
+            self.path = self.local_search(dist, n)
+        else:
+            self.path = self.branch_and_bound(dist, n)
+        return self.path
+
+
+# The cost matrix and shared bound of the parallel branch and bound, set once in every worker process
+_tour_dist = None
+_tour_bound = None
+
+
+def _init_tour_worker(dist, shared_bound) -> None:
+    global _tour_dist, _tour_bound
+    _tour_dist, _tour_bound = dist, shared_bound
+
+
+def _solve_tour_prefix(prefix: List[int]) -> Optional[Tuple[float, List[int]]]:
+    """Runs the branch and bound below `prefix` in a worker process, and returns the (cost, path) of the best path it
+    found, or None if no path below `prefix` beats the shared bound
+    """
+    n = len(_tour_dist)
+    fastest_path = FastestPath()
+    costs = np.array(_tour_dist, dtype=float)
+    fastest_path.undirected = np.minimum(costs, costs.T)
+    fastest_path.shared_bound = _tour_bound
+    fastest_path.min_cost = _tour_bound.value
+
+    visited = [i in prefix for i in range(n)]
+    fastest_path.tsp(
+        _tour_dist,
+        visited,
+        prefix[-1],
+        len(prefix),
+        n,
+        fastest_path.path_cost(_tour_dist, prefix),
+        list(prefix),
+    )
+    if not fastest_path.path:
+        return None
+    return fastest_path.path_cost(_tour_dist, fastest_path.path), fastest_path.path
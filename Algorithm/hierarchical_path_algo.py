@@ -0,0 +1,377 @@
+import heapq
+import itertools
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import config
+from constants import Movement
+from map import ClearanceMap
+from path_find_algo import (
+    BEARING_OFFSETS,
+    PathResult,
+    SearchStatus,
+    State,
+    heuristic,
+    neighbours,
+)
+from plan_cache import MISSING, leg_cache
+from setup_logger import logger
+
+# (next state, edge cost) of the abstract graph
+Edge = Tuple[State, int]
+
+
+class HierarchicalPlanner:
+    """
+    A hierarchical planner for large arenas, based on HPA*
+
+    The arena is split into square sectors of `sector_size` cells. Every stretch of a sector border where the robot can
+    drive across gets one entrance, in its middle, and the states on both sides of each entrance that face across the
+    border are the nodes of an abstract graph. Two nodes are joined by a single move across their border, or by the
+    cheapest path between them that stays within their sector
+
+    A leg connects its start and goal to the nodes of their sectors and the sectors around them, and searches the
+    abstract graph. The chosen route is then refined with an A* search that may only enter the sectors the route passes
+    through, so it can cut corners the route cannot, and never costs more than the route. If the abstract graph has no
+    route, e.g. the start is walled in but for a gap no entrance was placed in, the leg is searched over the whole arena
+    instead, so a leg is only unreachable if `find_path` finds no path either
+
+    The paths within a sector, and the connections of every start and goal to the abstract graph, are searched the
+    first time a leg needs them and kept for every later leg, so legs only ever search the sectors they pass near,
+    whatever the size of the arena. Legs may cost a little more than `find_path`'s, whose search is not confined to the
+    route's sectors
+
+    Usage:
+        planner = HierarchicalPlanner.for_clearance(clearance, cost)
+        result = planner.plan(start, goal)
+    """
+
+    def __init__(
+        self,
+        clearance: ClearanceMap,
+        cost: int,
+        sector_size: int = config.hierarchical_sector_size,
+    ):
+        self.clearance = clearance
+        self.cost = cost
+        self.sector_size = sector_size
+
+        # sector -> its abstract nodes
+        self.nodes: Dict[Tuple[int, int], List[State]] = {}
+        # abstract node -> the edges across its border
+        self.crossings: Dict[State, List[Edge]] = {}
+        # abstract node -> the edges within its sector, filled in one sector at a time by `_sector_edges`
+        self.sector_edges: Dict[State, List[Edge]] = {}
+        self._searched_sectors: Set[Tuple[int, int]] = set()
+        # start or goal of a leg -> the cost between it and every abstract node it is connected to, see `_attachment`
+        self.attachments: Dict[State, Dict[State, int]] = {}
+
+        started = time.perf_counter_ns()
+        self._build_entrances()
+        logger.debug(
+            f"Built {sum(map(len, self.nodes.values()))} abstract nodes in {len(self.nodes)} sectors "
+            f"in {(time.perf_counter_ns() - started) / 1e6:.2f} ms"
+        )
+
+    @classmethod
+    def for_clearance(
+        cls,
+        clearance: ClearanceMap,
+        cost: int,
+        sector_size: int = config.hierarchical_sector_size,
+    ) -> "HierarchicalPlanner":
+        """Returns the planner of `clearance`, building it the first time it is needed so every leg shares its sectors"""
+        key = (cls, cost, sector_size)
+        if key not in clearance.derived:
+            clearance.derived[key] = cls(clearance, cost, sector_size)
+        return clearance.derived[key]
+
+    def sector_of(self, state: State) -> Tuple[int, int]:
+        return state[0] // self.sector_size, state[1] // self.sector_size
+
+    def around(self, state: State) -> Set[Tuple[int, int]]:
+        """Returns the sector of `state` and the sectors next to it"""
+        row, col = self.sector_of(state)
+        return {
+            (row + d_row, col + d_col) for d_row in (-1, 0, 1) for d_col in (-1, 0, 1)
+        }
+
+    def in_sectors(self, sectors: Set[Tuple[int, int]]) -> Callable[[int, int], bool]:
+        """Returns a function that says whether a (row, col) cell is in any of `sectors`"""
+        size = self.sector_size
+        return lambda row, col: (row // size, col // size) in sectors
+
+    def in_sector(self, sector: Tuple[int, int]) -> Callable[[int, int], bool]:
+        """Returns a function that says whether a (row, col) cell is in `sector`"""
+        first_row, first_col = (
+            sector[0] * self.sector_size,
+            sector[1] * self.sector_size,
+        )
+        end_row, end_col = first_row + self.sector_size, first_col + self.sector_size
+        return (
+            lambda row, col: first_row <= row < end_row and first_col <= col < end_col
+        )
+
+    def _build_entrances(self) -> None:
+        size, is_free = self.sector_size, self.clearance.is_free
+        # borders between vertically adjacent sectors, crossed facing NORTH or SOUTH ...
+        for row in range(size - 1, self.clearance.rows - 1, size):
+            for col_start in range(0, self.clearance.cols, size):
+                cols = range(col_start, min(col_start + size, self.clearance.cols))
+                for run in self._runs(
+                    cols, lambda col: is_free(row, col) and is_free(row + 1, col)
+                ):
+                    self._add_entrance((row, run), (row + 1, run))
+        # ... and between horizontally adjacent sectors, crossed facing EAST or WEST
+        for col in range(size - 1, self.clearance.cols - 1, size):
+            for row_start in range(0, self.clearance.rows, size):
+                rows = range(row_start, min(row_start + size, self.clearance.rows))
+                for run in self._runs(
+                    rows, lambda row: is_free(row, col) and is_free(row, col + 1)
+                ):
+                    self._add_entrance((run, col), (run, col + 1))
+
+    @staticmethod
+    def _runs(cells: range, crossable) -> List[int]:
+        """Returns the middle of every run of consecutive `cells` where the border is `crossable`"""
+        middles, run = [], []
+        for cell in itertools.chain(cells, [None]):
+            if cell is not None and crossable(cell):
+                run.append(cell)
+            elif run:
+                middles.append(run[len(run) // 2])
+                run = []
+        return middles
+
+    def _add_entrance(self, first: Tuple[int, int], second: Tuple[int, int]) -> None:
+        for cell, other in ((first, second), (second, first)):
+            for bearing, (d_row, d_col) in BEARING_OFFSETS.items():
+                # only states facing across the border can drive across it
+                if abs(d_row) != abs(other[0] - cell[0]):
+                    continue
+                node = (cell[0], cell[1], bearing)
+                self.nodes.setdefault(self.sector_of(node), []).append(node)
+                self.crossings[node] = [
+                    (position, step_cost)
+                    for position, step_cost, _ in neighbours(
+                        node, self.cost, self.clearance
+                    )
+                    if position[:2] == other
+                ]
+
+    def _search(
+        self,
+        source: State,
+        inside: Callable[[int, int], bool],
+        targets: Set[State],
+        goal: Optional[State] = None,
+    ) -> Tuple[Dict[State, int], Dict[State, Tuple[State, Movement]], int]:
+        """Searches from `source` without leaving the cells that are `inside`, until every target is settled. This is
+        Dijkstra's algorithm, or A* towards `goal` if it is given (which must then be the only target)
+
+        Returns the cost of every settled state, the (parent, movement) of every reached state, and the number of
+        states expanded
+        """
+        remaining = set(targets)
+        g: Dict[State, int] = {source: 0}
+        parent: Dict[State, Tuple[State, Movement]] = {}
+        settled: Dict[State, int] = {}
+        estimate = (
+            (lambda state: 0)
+            if goal is None
+            else (lambda state: heuristic(state, goal, self.cost))
+        )
+        # (f, h, g, state) entries - equal f values prefer the state closest to the goal, as in `find_path`
+        yet_to_visit_heap = [(estimate(source), estimate(source), 0, source)]
+        while yet_to_visit_heap and remaining:
+            *_, cost, state = heapq.heappop(yet_to_visit_heap)
+            if state in settled:
+                continue
+            settled[state] = cost
+            remaining.discard(state)
+
+            for position, step_cost, movement in neighbours(
+                state, self.cost, self.clearance
+            ):
+                if not inside(position[0], position[1]):
+                    continue
+                if cost + step_cost < g.get(position, float("inf")):
+                    g[position] = cost + step_cost
+                    parent[position] = (state, movement)
+                    h = estimate(position)
+                    heapq.heappush(
+                        yet_to_visit_heap,
+                        (cost + step_cost + h, h, cost + step_cost, position),
+                    )
+        return settled, parent, len(settled)
+
+    def _sector_edges(self, node: State) -> Tuple[List[Edge], int]:
+        """Returns the edges within the sector of `node`, and the number of states expanded to find them"""
+        sector = self.sector_of(node)
+        nodes_expanded = 0
+        if sector not in self._searched_sectors:
+            self._searched_sectors.add(sector)
+            nodes = self.nodes.get(sector, [])
+            for source in nodes:
+                self.sector_edges[source] = []
+            # Driving a path backwards costs the same, so each search only needs to reach the nodes after its source
+            for i, source in enumerate(nodes[:-1]):
+                settled, _, expanded = self._search(
+                    source, self.in_sector(sector), set(nodes[i + 1 :])
+                )
+                nodes_expanded += expanded
+                for target in nodes[i + 1 :]:
+                    if target in settled:
+                        self.sector_edges[source].append((target, settled[target]))
+                        self.sector_edges[target].append((source, settled[target]))
+        return self.sector_edges.get(node, []), nodes_expanded
+
+    def plan(self, start: State, goal: State) -> PathResult:
+        """Returns a path from `start` to `goal`, with an UNREACHABLE status if there is none
+
+        Both are (row, col, bearing) states. The search counters of the result include the searches within sectors
+        done for this leg, but not those of earlier legs whose results were reused
+        """
+        # Identical (arena, start, end) legs are only ever searched once
+        cache_key = (
+            self.clearance.fingerprint,
+            start,
+            goal,
+            self.cost,
+            HierarchicalPlanner,
+            self.sector_size,
+        )
+        cached = leg_cache.get(cache_key, MISSING)
+        if cached is not MISSING:
+            logger.debug("Reusing cached path")
+            return cached
+
+        result = self._plan(start, goal)
+        leg_cache.put(cache_key, result)
+        return result
+
+    def _attachment(self, state: State) -> Tuple[Dict[State, int], int]:
+        """Returns the cost between `state` and every abstract node of its sector and the sectors next to it that it can
+        reach without leaving them, and the number of states expanded to find them. The costs are searched the first
+        time `state` starts or ends a leg, and kept for every later leg
+
+        A search from the goal finds the costs to the goal as well, since driving a path backwards costs the same. The
+        neighbouring sectors let a state on a sector border, whose own sector is blocked around it, still be connected
+        """
+        if state in self.attachments:
+            return self.attachments[state], 0
+
+        sectors = self.around(state)
+        targets = {
+            node for sector in sectors for node in self.nodes.get(sector, [])
+        } - {state}
+        settled, _, nodes_expanded = self._search(
+            state, self.in_sectors(sectors), targets
+        )
+        self.attachments[state] = {
+            node: cost for node, cost in settled.items() if node in targets
+        }
+        return self.attachments[state], nodes_expanded
+
+    def _plan(self, start: State, goal: State) -> PathResult:
+        started = time.perf_counter_ns()
+        start_edges, nodes_expanded = self._attachment(start)
+        goal_costs, expanded = self._attachment(goal)
+        nodes_expanded += expanded
+
+        # A* over the abstract graph
+        tie_breaker = itertools.count()
+        g: Dict[State, int] = {start: 0}
+        parent: Dict[State, State] = {}
+        closed: Set[State] = set()
+        yet_to_visit_heap = [
+            (heuristic(start, goal, self.cost), next(tie_breaker), start)
+        ]
+        nodes_generated = peak_open = 1
+        while yet_to_visit_heap:
+            _, _, node = heapq.heappop(yet_to_visit_heap)
+            if node in closed:
+                continue
+            closed.add(node)
+            nodes_expanded += 1
+            if node == goal:
+                break
+
+            if node == start:
+                edges = list(start_edges.items())
+            else:
+                edges, expanded = self._sector_edges(node)
+                nodes_expanded += expanded
+                edges = list(edges)
+            if node in self.crossings:
+                edges.extend(self.crossings[node])
+            if node != goal and node in goal_costs:
+                edges.append((goal, goal_costs[node]))
+
+            for successor, step_cost in edges:
+                if successor in closed:
+                    continue
+                cost = g[node] + step_cost
+                if cost >= g.get(successor, float("inf")):
+                    continue
+                g[successor] = cost
+                parent[successor] = node
+                heapq.heappush(
+                    yet_to_visit_heap,
+                    (
+                        cost + heuristic(successor, goal, self.cost),
+                        next(tie_breaker),
+                        successor,
+                    ),
+                )
+                nodes_generated += 1
+                peak_open = max(peak_open, len(yet_to_visit_heap))
+
+        if goal in closed:
+            # Refine the route with a search confined to the sectors it passes through
+            corridor = self.around(start) | self.around(goal)
+            node = goal
+            while node != start:
+                node = parent[node]
+                corridor.add(self.sector_of(node))
+            inside = self.in_sectors(corridor)
+        else:
+            # The abstract graph misses a connection between the start and the goal, if there is one
+            logger.debug(
+                f"No route from {start} to {goal} between sectors, searching the whole arena"
+            )
+            corridor = None
+            inside = lambda row, col: True
+
+        settled, refined, expanded = self._search(start, inside, {goal}, goal)
+        nodes_expanded += expanded
+        if goal not in settled:
+            logger.error(f"No path exists from {start} to {goal}")
+            result = PathResult.unreachable(
+                start, nodes_expanded, nodes_generated, peak_open
+            )
+            result.elapsed_ns = time.perf_counter_ns() - started
+            return result
+
+        states, movements = [goal], []
+        while states[-1] != start:
+            state, movement = refined[states[-1]]
+            states.append(state)
+            movements.append(movement)
+        states.reverse()
+        movements.reverse()
+
+        if corridor is not None:
+            logger.debug(
+                f"Found a path through {len(corridor)} sectors after expanding {nodes_expanded} nodes"
+            )
+        return PathResult(
+            states,
+            movements,
+            settled[goal],
+            SearchStatus.FOUND,
+            nodes_expanded,
+            nodes_generated,
+            peak_open,
+            time.perf_counter_ns() - started,
+        )
@@ -0,0 +1,240 @@
+import heapq
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from map import ClearanceMap
+from path_find_algo import (
+    BEARING_OFFSETS,
+    PathResult,
+    SearchStatus,
+    ShortestPathTree,
+    State,
+    heuristic,
+    neighbours,
+)
+from setup_logger import logger
+
+INFINITY = float("inf")
+
+
+class DStarLite:
+    """
+    An incremental planner for a single leg, based on D* Lite
+
+    The search runs backward from `goal`, so g[s] is the cost from s to the goal. When obstacles change, only the
+    states whose cost-to-goal is affected by the changed cells are re-expanded, instead of planning the leg from scratch
+
+    Usage:
+        planner = DStarLite(clearance, cost, start, goal)  # or DStarLite.from_tree(tree, cost, start)
+        result = planner.plan()
+        ...  # obstacles change, a new ClearanceMap is built
+        planner.update_clearance(new_clearance)
+        result = planner.plan()  # repairs the previous search tree
+    """
+
+    def __init__(self, clearance: ClearanceMap, cost: int, start: State, goal: State):
+        self.clearance = clearance
+        self.cost = cost
+        self.start = start
+        self.goal = goal
+
+        # km grows every time the start moves, so keys already in the open list stay lower bounds
+        self.km = 0
+        # g is the cost to goal as of the last expansion, and rhs the one-step lookahead cost to goal
+        self.g: Dict[State, float] = {}
+        self.rhs: Dict[State, float] = {goal: 0}
+
+        # open list with lazy deletion - open_keys holds the only valid key of every state in the open list
+        self.open_list: List[Tuple[Tuple[float, float], State]] = []
+        self.open_keys: Dict[State, Tuple[float, float]] = {}
+        # states pushed onto the open list, and the largest it has been, since the last plan - see PathResult
+        self.nodes_generated = self.peak_open = 0
+        self._push(goal)
+
+    @classmethod
+    def from_tree(cls, tree: ShortestPathTree, cost: int, start: State) -> "DStarLite":
+        """Returns the planner of the leg from `start` to the source of `tree`, picking up the search the tree did
+        instead of starting from scratch
+
+        Edges can be driven both ways at the same cost, so the tree's cost to every state is that state's cost to the
+        goal. The states the tree settled are consistent, and those it reached without settling are the open list
+        """
+        planner = cls(tree.clearance, cost, start, tree.source)
+        planner.open_list, planner.open_keys = [], {}
+        for state, g, settled in tree.reached():
+            planner.rhs[state] = g
+            if settled:
+                planner.g[state] = g
+            else:
+                planner._push(state)
+        planner.nodes_generated, planner.peak_open = 0, len(planner.open_list)
+        return planner
+
+    def _calculate_key(self, state: State) -> Tuple[float, float]:
+        best = min(self.g.get(state, INFINITY), self.rhs.get(state, INFINITY))
+        # distances are symmetric, so heuristic(state, start) is a lower bound on the cost from start to state
+        return best + heuristic(state, self.start, self.cost) + self.km, best
+
+    def _push(self, state: State) -> None:
+        key = self._calculate_key(state)
+        self.open_keys[state] = key
+        heapq.heappush(self.open_list, (key, state))
+        self.nodes_generated += 1
+        self.peak_open = max(self.peak_open, len(self.open_list))
+
+    def _top(self) -> Optional[Tuple[Tuple[float, float], State]]:
+        """Returns the valid (key, state) with the smallest key in the open list, dropping stale entries"""
+        while self.open_list:
+            key, state = self.open_list[0]
+            if self.open_keys.get(state) == key:
+                return key, state
+            heapq.heappop(self.open_list)
+        return None
+
+    def _successors(self, state: State):
+        # a state whose cell is blocked has no edges at all, except on the start cell which the robot can still drive out of
+        if state[:2] != self.start[:2] and not self.clearance.is_free(
+            state[0], state[1]
+        ):
+            return ()
+        return neighbours(state, self.cost, self.clearance)
+
+    def _predecessors(self, state: State) -> List[Tuple[State, int]]:
+        """Returns every (predecessor, edge_cost) that can drive into `state`"""
+        # edges can be driven both ways at the same cost, so predecessors are the successors
+        predecessors = [
+            (predecessor, step_cost)
+            for predecessor, step_cost, _ in self._successors(state)
+        ]
+        # ... but nothing can drive into a blocked start cell, so those states would never be found that way
+        if state[:2] != self.start[:2] and not self.clearance.is_free(
+            self.start[0], self.start[1]
+        ):
+            for bearing in BEARING_OFFSETS:
+                start_state = (self.start[0], self.start[1], bearing)
+                for successor, step_cost, _ in self._successors(start_state):
+                    if successor == state:
+                        predecessors.append((start_state, step_cost))
+        return predecessors
+
+    def _compute_rhs(self, state: State) -> float:
+        if state == self.goal:
+            return 0
+        return min(
+            (
+                step_cost + self.g.get(successor, INFINITY)
+                for successor, step_cost, _ in self._successors(state)
+            ),
+            default=INFINITY,
+        )
+
+    def _update_open_list(self, state: State) -> None:
+        """Puts `state` in the open list if it is inconsistent, or takes it out otherwise"""
+        self.open_keys.pop(state, None)
+        if self.g.get(state, INFINITY) != self.rhs.get(state, INFINITY):
+            self._push(state)
+
+    def _update_vertex(self, state: State) -> None:
+        self.rhs[state] = self._compute_rhs(state)
+        self._update_open_list(state)
+
+    def _compute_shortest_path(self) -> int:
+        """Expands states until the start is consistent, and returns the number of states expanded"""
+        nodes_expanded = 0
+        while True:
+            top = self._top()
+            if top is None:
+                break
+            key, state = top
+            start_g = self.g.get(self.start, INFINITY)
+            start_rhs = self.rhs.get(self.start, INFINITY)
+            if key >= self._calculate_key(self.start) and start_g == start_rhs:
+                break
+
+            heapq.heappop(self.open_list)
+            del self.open_keys[state]
+            nodes_expanded += 1
+
+            new_key = self._calculate_key(state)
+            if key < new_key:
+                self._push(state)
+            elif self.g.get(state, INFINITY) > self.rhs.get(state, INFINITY):
+                # overconsistent - the cost to goal went down, which can only lower the predecessors' rhs
+                g = self.g[state] = self.rhs[state]
+                for predecessor, step_cost in self._predecessors(state):
+                    if step_cost + g < self.rhs.get(predecessor, INFINITY):
+                        self.rhs[predecessor] = step_cost + g
+                        self._update_open_list(predecessor)
+            else:
+                # underconsistent - the cost to goal went up, so every predecessor that went through `state` is recomputed
+                g_old = self.g.get(state, INFINITY)
+                self.g[state] = INFINITY
+                for predecessor, step_cost in self._predecessors(state):
+                    if self.rhs.get(predecessor, INFINITY) == step_cost + g_old:
+                        self._update_vertex(predecessor)
+                self._update_vertex(state)
+        return nodes_expanded
+
+    def update_clearance(self, clearance: ClearanceMap) -> int:
+        """Switches to a new configuration space of the same arena, and marks the states next to every cell that
+        became blocked or free for repair. Returns the number of cells that changed
+        """
+        changed_cells = np.argwhere(self.clearance.blocked != clearance.blocked)
+        self.clearance = clearance
+
+        for row, col in changed_cells.tolist():
+            # states on the changed cell, and on every cell that can drive onto it
+            for d_row, d_col in ((0, 0), (-1, 0), (1, 0), (0, -1), (0, 1)):
+                for bearing in BEARING_OFFSETS:
+                    self._update_vertex((row + d_row, col + d_col, bearing))
+
+        logger.debug(f"{len(changed_cells)} cells changed since the last plan")
+        return len(changed_cells)
+
+    def update_start(self, start: State) -> None:
+        """Moves the start of the leg (e.g. the robot did not end the previous leg where it was planned to)"""
+        self.km += heuristic(start, self.start, self.cost)
+        self.start = start
+
+    def plan(self) -> PathResult:
+        """Returns the cheapest path from the start to the goal, with an UNREACHABLE status if there is none
+
+        The search counters of the result include the repairs queued by `update_clearance` since the last plan
+        """
+        started = time.perf_counter_ns()
+        nodes_expanded = self._compute_shortest_path()
+        nodes_generated, peak_open = self.nodes_generated, self.peak_open
+        self.nodes_generated, self.peak_open = 0, len(self.open_list)
+        cost = self.g.get(self.start, INFINITY)
+        if cost == INFINITY:
+            logger.error(f"No path exists from {self.start} to {self.goal}")
+            result = PathResult.unreachable(
+                self.start, nodes_expanded, nodes_generated, peak_open
+            )
+            result.elapsed_ns = time.perf_counter_ns() - started
+            return result
+
+        # Follow the cheapest successor from the start to the goal
+        states, movements = [self.start], []
+        state = self.start
+        while state != self.goal:
+            _, state, movement = min(
+                (step_cost + self.g.get(successor, INFINITY), successor, movement)
+                for successor, step_cost, movement in self._successors(state)
+            )
+            states.append(state)
+            movements.append(movement)
+
+        logger.debug(f"Repaired the path after expanding {nodes_expanded} nodes")
+        return PathResult(
+            states,
+            movements,
+            int(cost),
+            SearchStatus.FOUND,
+            nodes_expanded,
+            nodes_generated,
+            peak_open,
+            time.perf_counter_ns() - started,
+        )
@@ -9,10 +9,12 @@ parser.add_argument(
     "-v", "--verbose", help="Increase output verbosity", action="store_true"
 )
 
-args = parser.parse_args()
-if args.verbose:
-    logging.basicConfig(level=logging.DEBUG)
-else:
-    logging.basicConfig(level=logging.INFO)
+# the tour solver may start worker processes, which import this module again on platforms that spawn them
+if __name__ == "__main__":
+    args = parser.parse_args()
+    if args.verbose:
+        logging.basicConfig(level=logging.DEBUG)
+    else:
+        logging.basicConfig(level=logging.INFO)
 
-x = Simulator()
+    x = Simulator()
@@ -1,67 +1,73 @@
-from typing import List
+from typing import Any, Dict, Hashable, List, Optional
 
 import numpy as np
 
 import config
-from constants import Obstacle
+from constants import Distance, Obstacle
+from plan_cache import leg_cache
 
 # Grid is 0-indexed
 # (x, y) = (0, 0) corresponds to the top left cell
 # (x, y) = (ncols, nrows) corresponds to the bottom right cell
-# ncols = nrows = 20, since we're using a 20x20 grid
+# ncols and nrows are config.map_size, e.g. 20x20 for the competition arena
 
 # TODO - ENCODE 10,11,12,13 AS PART OF ENUM, MAYBE UNDER MAP_STATE
 # 0 - empty spaces
 # 1 - occupied spaces - each obstacle occupies only a 10cm x 10cm space (~half a grid cell),
 # the extra radius is probably to prevent robot from going too close
 # 10 (N), 11 (E), 12 (S), 13 (W) - represents the direction the obstacle is facing
-map_sim: List[List[int]] = [
-    [1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [1, 12, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 13, 1, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 1, 10, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 13],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 0, 0, 0, 0, 0, 0, 1, 1],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 11, 1, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 11, 1, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-]
-
-map_fc: List[List[int]] = [
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 0, 1, 0, 0, 0],
-    [1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 0, 1, 0, 0, 0],
-    [1, 0, 0, 0, 0, 0, 0, 10, 0, 0, 0, 0, 0, 0, 10, 0, 10, 0, 0, 0],
-    [1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 0, 1, 0, 0, 0],
-    [1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 0, 1, 0, 0, 0],
-    [1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 0, 1, 0, 0, 0],
-    [1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-]
-
-map_virtual: List[List[int]] = [row.copy() for row in map_sim]
+# The arena every new Map starts from. Maps copy it, so it is never modified
+map_sim: np.ndarray = np.array(
+    [
+        [1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [1, 12, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 13, 1, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 1, 10, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 13],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 0, 0, 0, 0, 0, 0, 1, 1],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 11, 1, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 11, 1, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+    ],
+    dtype=int,
+)
+
+map_fc: np.ndarray = np.array(
+    [
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 0, 1, 0, 0, 0],
+        [1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 0, 1, 0, 0, 0],
+        [1, 0, 0, 0, 0, 0, 0, 10, 0, 0, 0, 0, 0, 0, 10, 0, 10, 0, 0, 0],
+        [1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 0, 1, 0, 0, 0],
+        [1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 0, 1, 0, 0, 0],
+        [1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 0, 1, 0, 0, 0],
+        [1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+    ],
+    dtype=int,
+)
 
 # ----------------------------------------------------------------------
 #   Map Legend:
@@ -69,84 +75,147 @@ map_virtual: List[List[int]] = [row.copy() for row in map_sim]
 #   +ve - obstacle
 # ----------------------------------------------------------------------
 
-map_virtual_w: List[List[int]] = [
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-]
-
 # for fastest car
 # map_sim = map_fc
 
 
+class ClearanceMap:
+    """
+    Configuration space of the robot centre for one arena, computed once so that the
+    planner and the robot can check whether a cell is usable in O(1)
+
+    footprint_blocked[row][col] is True if the robot's 3x3 footprint centred at (row, col) would overlap an obstacle
+    blocked[row][col] is True if the robot centre may not be placed at (row, col) by the planner, i.e. the
+    footprint overlaps an obstacle, the cell is a wall, or the cell is within `Distance.MIN_SEPARATION`
+    cells vertically or horizontally of an obstacle
+    """
+
+    WALLS = (1, 10, 11, 12, 13)
+    OBSTACLES = (10, 11, 12, 13)
+
+    def __init__(self, maze, obstacles: List[Obstacle] = ()):
+        grid = np.asarray(maze, dtype=int)
+        self.rows, self.cols = grid.shape
+
+        # Obstacles drawn on the map (e.g. via the simulator) and obstacles sent via Android
+        obstacle_cells = set(zip(*np.nonzero(np.isin(grid, self.OBSTACLES))))
+        obstacle_cells.update((obstacle.y, obstacle.x) for obstacle in obstacles)
+
+        separation = Distance.MIN_SEPARATION.value
+        footprint = np.zeros(grid.shape, dtype=bool)
+        buffer = np.zeros(grid.shape, dtype=bool)
+        for row, col in obstacle_cells:
+            if not (0 <= row < self.rows and 0 <= col < self.cols):
+                continue
+            footprint[max(row - 1, 0) : row + 2, max(col - 1, 0) : col + 2] = True
+            buffer[max(row - separation, 0) : row + separation + 1, col] = True
+            buffer[row, max(col - separation, 0) : col + separation + 1] = True
+
+        self.footprint_blocked: np.ndarray = footprint
+        self.blocked: np.ndarray = footprint | buffer | np.isin(grid, self.WALLS)
+
+        # Plain nested lists are much faster than numpy scalar indexing in the planner's inner loop
+        self._blocked_rows: List[List[bool]] = self.blocked.tolist()
+        self._footprint_rows: List[List[bool]] = self.footprint_blocked.tolist()
+
+        # Two arenas with the same configuration space have the same paths, so this identifies cached legs
+        self.fingerprint: int = hash((self.blocked.shape, self.blocked.tobytes()))
+
+        # Data that planners derive from this configuration space (e.g. lookup tables), built at most once per arena
+        self.derived: Dict[Hashable, Any] = {}
+
+    def is_free(self, row: int, col: int) -> bool:
+        """Returns True if the planner may place the robot centre at (row, col)"""
+        return (
+            0 <= row < self.rows
+            and 0 <= col < self.cols
+            and not self._blocked_rows[row][col]
+        )
+
+    def footprint_is_free(self, row: int, col: int) -> bool:
+        """Returns True if the robot centred at (row, col) does not overlap any obstacle"""
+        return (
+            0 <= row < self.rows
+            and 0 <= col < self.cols
+            and not self._footprint_rows[row][col]
+        )
+
+
 class Map:
-    def __init__(self):
-        pass
+    """
+    Class to represent one arena. Every Map owns its grids, so several arenas can be built and planned side by side,
+    e.g. in worker threads
+
+    grid is the arena that is planned on and drawn, indexed as grid[y][x]
+    virtual is the arena that `reset` restores, i.e. the arena as of the last `create_map`
+    obstacles are those last passed to `create_map`, or those of `layout` if it is an arena that was already built
+    """
+
+    def __init__(self, layout=None, obstacles: List[Obstacle] = ()):
+        if layout is None:
+            shape = (config.map_size["height"], config.map_size["width"])
+            # the sample arena is only used if it fits, otherwise the arena starts empty
+            layout = map_sim if map_sim.shape == shape else np.zeros(shape)
+        self.grid: np.ndarray = np.array(layout, dtype=int)
+        self.virtual: np.ndarray = self.grid.copy()
+        self.obstacles: List[Obstacle] = list(obstacles)
+        # configuration space built from grid, rebuilt lazily by clearance() after it has been invalidated
+        self._clearance: Optional[ClearanceMap] = None
+
+    def clearance(self) -> ClearanceMap:
+        """Returns the configuration space of the current arena, rebuilding it only if it was invalidated"""
+        if self._clearance is None:
+            self._clearance = ClearanceMap(self.grid, self.obstacles)
+        return self._clearance
+
+    def invalidate_clearance(self) -> None:
+        """Marks the configuration space as stale. Must be called whenever obstacles in grid change"""
+        self._clearance = None
 
     def is_obstacle(self, x, y, sim=True):
         if sim:
-            return map_sim[x][y] in [10, 11, 12, 13]  # TODO - direction encoding
+            return (
+                self.grid[x, y] in ClearanceMap.OBSTACLES
+            )  # TODO - direction encoding
 
     def is_free(self, x, y, sim=True):
         return not self.is_obstacle(x, y, sim)
 
     def valid_range(self, y, x):
-        return (0 <= y < config.map_size["height"]) and (
-            0 <= x < config.map_size["width"]
-        )
+        return (0 <= y < self.grid.shape[0]) and (0 <= x < self.grid.shape[1])
 
     def is_valid_open(self, x, y):
-        return map_sim[x][y] == 0
+        return bool(self.grid[x, y] == 0)
+
+    def _forget_layout(self) -> None:
+        """Drops the cached legs of the current arena, which is being replaced by a different one"""
+        if self._clearance is not None:
+            leg_cache.clear(self._clearance.fingerprint)
 
     def reset(self):
-        for x in range(config.map_size["width"]):
-            for y in range(config.map_size["height"]):
-                map_sim[y][x] = map_virtual[y][x]
+        if not np.array_equal(self.grid, self.virtual):
+            self._forget_layout()
+        self.grid = self.virtual.copy()
+        self.invalidate_clearance()
 
     def create_map(self, obstacles: List[Obstacle]):
-        for x in range(config.map_size["width"]):
-            for y in range(config.map_size["height"]):
-                map_sim[y][x] = map_virtual_w[y][x]
+        grid = np.zeros_like(self.grid)
 
         for obstacle in obstacles:
-            for row in range(config.map_size["width"]):
-                for column in range(config.map_size["height"]):
-                    if row == obstacle.x and column == obstacle.y:
-                        map_sim[column][row] = obstacle.direction
-                        for j in range(3):
-                            for k in range(3):
-                                if not (
-                                    obstacle.x - 1 + k < 0
-                                    or obstacle.x + k > config.map_size["width"]
-                                    or obstacle.y - 1 + j < 0
-                                    or obstacle.y - 1 + j >= config.map_size["height"]
-                                ):
-                                    # Skip the obstacle itself to prevent changes
-                                    if not map_sim[obstacle.y - 1 + j][
-                                        obstacle.x - 1 + k
-                                    ] in [10, 11, 12, 13]:
-                                        # Update surrounding wall near the obstacle (3x3)
-                                        map_sim[obstacle.y - 1 + j][
-                                            obstacle.x - 1 + k
-                                        ] = 1
-
-        for x in range(config.map_size["width"]):
-            for y in range(config.map_size["height"]):
-                map_virtual[y][x] = map_sim[y][x]
+            if not self.valid_range(obstacle.y, obstacle.x):
+                continue
+            grid[obstacle.y, obstacle.x] = obstacle.direction
+            # Update surrounding wall near the obstacle (3x3), skipping obstacles to prevent changes
+            border = grid[
+                max(obstacle.y - 1, 0) : obstacle.y + 2,
+                max(obstacle.x - 1, 0) : obstacle.x + 2,
+            ]
+            border[~np.isin(border, ClearanceMap.OBSTACLES)] = 1
+
+        if not (np.array_equal(grid, self.grid) and self.obstacles == list(obstacles)):
+            self._forget_layout()
+        self.grid = grid
+        self.virtual = grid.copy()
+        self.obstacles = list(obstacles)
+        # the configuration space is only built once it is needed, e.g. not before a reset that follows
+        self.invalidate_clearance()
@@ -1,24 +1,111 @@
-from typing import List
+import functools
+import heapq
+import itertools
+import math
+import time
+from array import array
+from dataclasses import dataclass
+from enum import Enum
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 
 import numpy as np
 
-from constants import Distance, Obstacle
+import config
+from constants import Bearing, Cost, Movement, Obstacle
+from map import ClearanceMap
+from plan_cache import MISSING, leg_cache
 from setup_logger import logger
 
+# A state on the search lattice - (row, col, bearing). Only the 4 cardinal bearings are used, unless diagonal
+# MotionPrimitives are enabled
+State = Tuple[int, int, Bearing]
+
+
+class SearchEngine(Enum):
+    # A* over every cell of the lattice
+    ASTAR = "astar"
+    # A* over jump points only - straight runs through open floor are a single edge
+    JPS = "jps"
+    # A* from both the start and the end at once, meeting in the middle
+    BIDIRECTIONAL = "bidirectional"
+
+
+class Primitive(Enum):
+    """
+    Moves of the extended MotionPrimitives, on top of the Movement commands. The STM has no commands for them yet, so
+    they are only planned - Robot never plans with them, and they are never sent to the STM
+    """
+
+    # forward and reverse along a diagonal bearing
+    FORWARD_DIAG = "forward_diag"
+    REVERSE_DIAG = "reverse_diag"
+    # 45 degree turns on the spot
+    LEFT_DIAG = "left_diag"
+    RIGHT_DIAG = "right_diag"
+    # 90 degree forward arc turns
+    ARC_LEFT = "arc_left"
+    ARC_RIGHT = "arc_right"
+
+
+# A single move on the search lattice - a Primitive is only ever planned with extended MotionPrimitives
+Step = Union[Movement, Primitive]
+
+
+class SearchStatus(Enum):
+    """How a search finished"""
+
+    # the path reaches the goal
+    FOUND = "found"
+    # the goal cannot be reached from the start - the path only holds the start
+    UNREACHABLE = "unreachable"
+    # the search ran out of expansions - the path ends at the most promising state found so far
+    BUDGET_EXHAUSTED = "budget_exhausted"
+
+
+# (row, col) offset of a single step forward for each cardinal bearing
+BEARING_OFFSETS = {
+    Bearing.NORTH: (-1, 0),
+    Bearing.EAST: (0, 1),
+    Bearing.SOUTH: (1, 0),
+    Bearing.WEST: (0, -1),
+}
+# (row, col) offset of a single step forward for each diagonal bearing
+DIAGONAL_OFFSETS = {
+    Bearing.NORTH_EAST: (-1, 1),
+    Bearing.SOUTH_EAST: (1, 1),
+    Bearing.SOUTH_WEST: (1, -1),
+    Bearing.NORTH_WEST: (-1, -1),
+}
+# bearing after turning left or right on the spot, looked up instead of recomputed in the search's inner loop
+LEFT_OF = {bearing: Bearing.prev_bearing(bearing) for bearing in BEARING_OFFSETS}
+RIGHT_OF = {bearing: Bearing.next_bearing(bearing) for bearing in BEARING_OFFSETS}
+# the cardinal bearings in order, i.e. CARDINAL_BEARINGS[bearing // 2] == bearing
+CARDINAL_BEARINGS = tuple(BEARING_OFFSETS)
+
+# The movement that undoes each movement, i.e. the movement along the same edge in the opposite direction
+INVERSE_MOVEMENT = {
+    Movement.FORWARD: Movement.REVERSE,
+    Movement.REVERSE: Movement.FORWARD,
+    Movement.LEFT: Movement.RIGHT,
+    Movement.RIGHT: Movement.LEFT,
+}
+
 
 class Node:
     """
     A node class for A* Pathfinding
     parent is parent of the current Node
-    position is current position of the Node in the maze
+    position is current (row, col, bearing) state of the Node in the maze
+    movement is the Movement taken from the parent's state to reach this state
     g is cost from start to current Node
     h is heuristic based estimated cost for current Node to end Node
     f is total cost of present node i.e. :  f = g + h
     """
 
-    def __init__(self, parent=None, position=None):
+    def __init__(self, parent=None, position=None, movement=None):
         self.parent = parent
         self.position = position
+        self.movement = movement
 
         self.g = 0
         self.h = 0
@@ -28,26 +115,662 @@ class Node:
         return self.position == other.position
 
 
+@dataclass
+class PathResult:
+    """
+    Class to represent a path found by the search, in the order the robot executes it
+
+    states[0] is the start state and states[-1] is the state the search finished in
+    movements[i] is the Movement (or Primitive) that takes the robot from states[i] to states[i + 1]
+    cost is the total cost of all the movements
+    status is how the search finished - see `SearchStatus`
+    nodes_expanded is the number of states the search expanded to find this path
+    nodes_generated is the number of states the search pushed onto its open set
+    peak_open is the largest size the open set reached
+    elapsed_ns is the wall time the search took
+    """
+
+    states: List[State]
+    movements: List[Step]
+    cost: int
+    status: SearchStatus = SearchStatus.FOUND
+    nodes_expanded: int = 0
+    nodes_generated: int = 0
+    peak_open: int = 0
+    elapsed_ns: int = 0
+
+    @property
+    def reached_goal(self) -> bool:
+        return self.status == SearchStatus.FOUND
+
+    @classmethod
+    def unreachable(
+        cls,
+        start: State,
+        nodes_expanded: int = 0,
+        nodes_generated: int = 0,
+        peak_open: int = 0,
+    ) -> "PathResult":
+        """Returns the result of a search that proved the goal cannot be reached from `start`"""
+        return cls(
+            [start],
+            [],
+            0,
+            SearchStatus.UNREACHABLE,
+            nodes_expanded,
+            nodes_generated,
+            peak_open,
+        )
+
+    @classmethod
+    def from_node(
+        cls,
+        node: Node,
+        status: SearchStatus = SearchStatus.FOUND,
+        nodes_expanded: int = 0,
+        nodes_generated: int = 0,
+        peak_open: int = 0,
+    ) -> "PathResult":
+        """Builds the path ending at `node` by following its parents back to the start
+
+        A node may be several cells away from its parent along a straight line (e.g. after a jump), in which case
+        the single-cell moves in between are filled in. Any other movement (e.g. an arc) is a single step
+        """
+        cost = node.g
+        states, movements = [], []
+        while node is not None:
+            states.append(node.position)
+            if node.movement in (Movement.FORWARD, Movement.REVERSE):
+                parent_row, parent_col = node.parent.position[:2]
+                d_row, d_col = (
+                    node.position[0] - parent_row,
+                    node.position[1] - parent_col,
+                )
+                steps = max(abs(d_row), abs(d_col))
+                for step in range(steps - 1, 0, -1):
+                    states.append(
+                        (
+                            parent_row + d_row // steps * step,
+                            parent_col + d_col // steps * step,
+                            node.position[2],
+                        )
+                    )
+                movements.extend([node.movement] * steps)
+            elif node.movement is not None:
+                movements.append(node.movement)
+            node = node.parent
+        # Return reversed path as we need to show from start to end path
+        states.reverse()
+        movements.reverse()
+        return cls(
+            states, movements, cost, status, nodes_expanded, nodes_generated, peak_open
+        )
+
+    def to_matrix(self, maze) -> List[List[int]]:
+        """Returns the path as a matrix the same shape as `maze`, where every cell on the path holds its step number
+        (0 for the start cell) and every other cell holds -1. Turning on the spot does not count as a step
+        """
+        no_rows, no_columns = np.shape(maze)
+        # here we create the initialized result maze with -1 in every position
+        result = [[-1 for i in range(no_columns)] for j in range(no_rows)]
+        start_value = 0
+        result[self.states[0][0]][self.states[0][1]] = start_value
+        for previous, current in zip(self.states, self.states[1:]):
+            if current[:2] != previous[:2]:
+                start_value += 1
+                result[current[0]][current[1]] = start_value
+        return result
+
+
 # This function return the path of the search
 
 
 def return_path(current_node, maze):
-    path = []
-    no_rows, no_columns = np.shape(maze)
-    # here we create the initialized result maze with -1 in every position
-    result = [[-1 for i in range(no_columns)] for j in range(no_rows)]
-    current = current_node
-    while current is not None:
-        path.append(current.position)
-        current = current.parent
-    # Return reversed path as we need to show from start to end path
-    path = path[::-1]
-    start_value = 0
-    # we update the path of start to end found by A-star serch with every step incremented by 1
-    for i in range(len(path)):
-        result[path[i][0]][path[i][1]] = start_value
-        start_value += 1
-    return result
+    return PathResult.from_node(current_node).to_matrix(maze)
+
+
+def to_state(position) -> State:
+    """Converts a (row, col, direction) position, where direction is encoded as 10 (N), 11 (E), 12 (S) or 13 (W), to a lattice state"""
+    return (
+        int(position[0]),
+        int(position[1]),
+        Bearing.int_to_bearing(Bearing.conversion_robot(position[2])),
+    )
+
+
+def turns_between(from_bearing: Bearing, to_bearing: Bearing) -> int:
+    """Returns the minimum number of 90 degree turns needed to rotate from `from_bearing` to `to_bearing`"""
+    diff = (to_bearing - from_bearing) % 8
+    return min(diff, 8 - diff) // 2
+
+
+def heuristic(state: State, goal: State, cost: int) -> int:
+    """Admissible and consistent estimate of the cost from `state` to `goal`
+
+    Every cell of Manhattan distance costs at least one move. The robot can only move along the axis it is facing,
+    so any displacement along the other axis needs at least one turn, and the goal bearing needs at least
+    `turns_between` turns. Moves never change either turn bound, so the larger of the two is a lower bound on turns
+
+    Args:
+        state (State): The (row, col, bearing) to estimate from
+        goal (State): The (row, col, bearing) goal
+        cost (int): The cost of a single forward or reverse move
+
+    Returns:
+        int: A lower bound on the cost from `state` to `goal`
+    """
+    d_row, d_col = goal[0] - state[0], goal[1] - state[1]
+    if state[2] in (Bearing.NORTH, Bearing.SOUTH):
+        axis_turns = 1 if d_col else 0
+    else:
+        axis_turns = 1 if d_row else 0
+    turns = max(axis_turns, turns_between(state[2], goal[2]))
+    return cost * (abs(d_row) + abs(d_col)) + Cost.TURN_COST * turns
+
+
+def neighbours(
+    state: State, cost: int, clearance: ClearanceMap
+) -> Iterator[Tuple[State, int, Movement]]:
+    """Yields every (next_state, edge_cost, movement) reachable from `state` with a single robot command
+
+    Forward and reverse moves keep the bearing and cost `cost`; left and right turns rotate on the spot and cost `Cost.TURN_COST`
+    """
+    row, col, bearing = state
+    d_row, d_col = BEARING_OFFSETS[bearing]
+
+    if clearance.is_free(row + d_row, col + d_col):
+        yield (row + d_row, col + d_col, bearing), cost, Movement.FORWARD
+    if clearance.is_free(row - d_row, col - d_col):
+        yield (row - d_row, col - d_col, bearing), cost, Movement.REVERSE
+    yield (row, col, LEFT_OF[bearing]), Cost.TURN_COST, Movement.LEFT
+    yield (row, col, RIGHT_OF[bearing]), Cost.TURN_COST, Movement.RIGHT
+
+
+def rotate(offset: Tuple[int, int], bearing: Bearing) -> Tuple[int, int]:
+    """Rotates a (row, col) offset given for NORTH (or NORTH_EAST, for a diagonal bearing) to face `bearing`"""
+    d_row, d_col = offset
+    for _ in range(bearing // 2):
+        d_row, d_col = d_col, -d_row
+    return d_row, d_col
+
+
+@dataclass(frozen=True)
+class MotionPrimitives:
+    """
+    Class to represent the set of motion primitives a robot can execute, on top of moving forward and reverse along
+    its cardinal bearing and turning 90 degrees on the spot
+
+    diagonal adds 45 degree turns on the spot, and forward and reverse moves along the diagonal bearings
+    arc_radius adds 90 degree forward arc turns of that radius (in cells), if it is above 0
+
+    Usage:
+        primitives = MotionPrimitives(diagonal=True, arc_radius=2)
+        find_path(maze, cost, start, end, obstacles, primitives=primitives)
+    """
+
+    diagonal: bool = False
+    arc_radius: int = 0
+
+    @property
+    def extended(self) -> bool:
+        """Returns True if any primitive beyond the 4-connected lattice is enabled"""
+        return self.diagonal or self.arc_radius > 0
+
+    def arc_offset(self, bearing: Bearing, movement: Primitive) -> Tuple[int, int]:
+        """Returns the (row, col) offset an ARC_LEFT or ARC_RIGHT `movement` drives from a cardinal `bearing`"""
+        side = -1 if movement == Primitive.ARC_LEFT else 1
+        return rotate((-self.arc_radius, side * self.arc_radius), bearing)
+
+    @functools.lru_cache(maxsize=None)
+    def table(
+        self, cost: int
+    ) -> Dict[
+        Bearing, List[Tuple[int, int, Bearing, int, Step, List[Tuple[int, int]]]]
+    ]:
+        """Returns, for every bearing, the (d_row, d_col, next_bearing, edge_cost, movement, swept_cells) of each
+        primitive, where every (row, col) offset in swept_cells must be free for the primitive to be driven
+        """
+        diagonal_cost = round(cost * Cost.MOVE_COST_DIAG / Cost.MOVE_COST)
+        arc_cost = round(cost * math.pi * self.arc_radius / 2)
+
+        table = {}
+        for bearing in BEARING_OFFSETS:
+            primitives = [
+                ((-1, 0), bearing, cost, Movement.FORWARD, [(-1, 0)]),
+                ((1, 0), bearing, cost, Movement.REVERSE, [(1, 0)]),
+                ((0, 0), LEFT_OF[bearing], Cost.TURN_COST, Movement.LEFT, []),
+                ((0, 0), RIGHT_OF[bearing], Cost.TURN_COST, Movement.RIGHT, []),
+            ]
+            if self.diagonal:
+                primitives += [
+                    (
+                        (0, 0),
+                        Bearing.prev_bearing_diag(bearing),
+                        Cost.TURN_COST_DIAG,
+                        Primitive.LEFT_DIAG,
+                        [],
+                    ),
+                    (
+                        (0, 0),
+                        Bearing.next_bearing_diag(bearing),
+                        Cost.TURN_COST_DIAG,
+                        Primitive.RIGHT_DIAG,
+                        [],
+                    ),
+                ]
+            if self.arc_radius > 0:
+                # the arc sweeps the square between the start and the end cell
+                radius = self.arc_radius
+                for movement, side, next_bearing in (
+                    (Primitive.ARC_LEFT, -1, LEFT_OF[bearing]),
+                    (Primitive.ARC_RIGHT, 1, RIGHT_OF[bearing]),
+                ):
+                    swept = [
+                        (-row, side * col)
+                        for row in range(radius + 1)
+                        for col in range(radius + 1)
+                        if row or col
+                    ]
+                    primitives.append(
+                        (
+                            (-radius, side * radius),
+                            next_bearing,
+                            arc_cost,
+                            movement,
+                            swept,
+                        )
+                    )
+            table[bearing] = primitives
+
+        if self.diagonal:
+            for bearing in DIAGONAL_OFFSETS:
+                table[bearing] = [
+                    (
+                        (-1, 1),
+                        bearing,
+                        diagonal_cost,
+                        Primitive.FORWARD_DIAG,
+                        [(-1, 0), (0, 1), (-1, 1)],
+                    ),
+                    (
+                        (1, -1),
+                        bearing,
+                        diagonal_cost,
+                        Primitive.REVERSE_DIAG,
+                        [(1, 0), (0, -1), (1, -1)],
+                    ),
+                    (
+                        (0, 0),
+                        Bearing.prev_bearing_diag(bearing),
+                        Cost.TURN_COST_DIAG,
+                        Primitive.LEFT_DIAG,
+                        [],
+                    ),
+                    (
+                        (0, 0),
+                        Bearing.next_bearing_diag(bearing),
+                        Cost.TURN_COST_DIAG,
+                        Primitive.RIGHT_DIAG,
+                        [],
+                    ),
+                ]
+
+        # the offsets above are given for NORTH (or NORTH_EAST) - rotate them to face each bearing
+        return {
+            bearing: [
+                (
+                    *rotate(offset, bearing),
+                    next_bearing,
+                    edge_cost,
+                    movement,
+                    [rotate(cell, bearing) for cell in swept],
+                )
+                for offset, next_bearing, edge_cost, movement, swept in primitives
+            ]
+            for bearing, primitives in table.items()
+        }
+
+    def successors(
+        self, state: State, cost: int, clearance: ClearanceMap
+    ) -> Iterator[Tuple[State, int, Step]]:
+        """Yields every (next_state, edge_cost, movement) reachable from `state` with a single primitive - see `neighbours`"""
+        row, col, bearing = state
+        for d_row, d_col, next_bearing, edge_cost, movement, swept in self.table(cost)[
+            bearing
+        ]:
+            if all(
+                clearance.is_free(row + cell_row, col + cell_col)
+                for cell_row, cell_col in swept
+            ):
+                yield (row + d_row, col + d_col, next_bearing), edge_cost, movement
+
+    def heuristic(self, state: State, goal: State, cost: int) -> float:
+        """Admissible and consistent estimate of the cost from `state` to `goal` using these primitives
+
+        Without diagonal moves or arcs this is `heuristic`. Otherwise it is the octile distance, where each cell moved
+        diagonally costs at most as much as a diagonal move or an arc would
+        """
+        if not self.extended:
+            return heuristic(state, goal, cost)
+        d_row, d_col = abs(goal[0] - state[0]), abs(goal[1] - state[1])
+        diagonal_cost = cost * Cost.MOVE_COST_DIAG / Cost.MOVE_COST
+        return cost * abs(d_row - d_col) + diagonal_cost * min(d_row, d_col)
+
+
+def is_turning_point(
+    clearance: ClearanceMap, row: int, col: int, d_row: int, d_col: int
+) -> bool:
+    """Returns True if a cell beside (row, col) is free while the same side of the previous cell along (d_row, d_col)
+    is blocked, i.e. a new perpendicular corridor opens up at (row, col) - this is a forced neighbour in Jump Point Search
+    """
+    for s_row, s_col in ((d_col, d_row), (-d_col, -d_row)):
+        if clearance.is_free(row + s_row, col + s_col) and not clearance.is_free(
+            row - d_row + s_row, col - d_col + s_col
+        ):
+            return True
+    return False
+
+
+class JumpTable:
+    """
+    Per-arena lookup tables that let Jump Point Search scan a straight line in O(1)
+
+    For every cardinal (d_row, d_col) direction and every cell:
+    wall_steps is the number of free cells that can be walked from the cell along the direction before a wall
+    turn_steps is the number of steps from the cell to the first turning point along the direction before a wall, or -1 if there is none
+    """
+
+    def __init__(self, clearance: ClearanceMap):
+        self.wall_steps: Dict[Tuple[int, int], List[List[int]]] = {}
+        self.turn_steps: Dict[Tuple[int, int], List[List[int]]] = {}
+
+        for d_row, d_col in BEARING_OFFSETS.values():
+            wall_steps = [[0] * clearance.cols for _ in range(clearance.rows)]
+            turn_steps = [[-1] * clearance.cols for _ in range(clearance.rows)]
+            # visit every cell after the cell next to it along the direction, so that neighbour is already filled in
+            rows = (
+                range(clearance.rows - 1, -1, -1)
+                if d_row > 0
+                else range(clearance.rows)
+            )
+            cols = (
+                range(clearance.cols - 1, -1, -1)
+                if d_col > 0
+                else range(clearance.cols)
+            )
+            for row in rows:
+                for col in cols:
+                    next_row, next_col = row + d_row, col + d_col
+                    if not clearance.is_free(next_row, next_col):
+                        continue
+                    wall_steps[row][col] = wall_steps[next_row][next_col] + 1
+                    if is_turning_point(clearance, next_row, next_col, d_row, d_col):
+                        turn_steps[row][col] = 1
+                    elif turn_steps[next_row][next_col] != -1:
+                        turn_steps[row][col] = turn_steps[next_row][next_col] + 1
+            self.wall_steps[(d_row, d_col)] = wall_steps
+            self.turn_steps[(d_row, d_col)] = turn_steps
+
+    @classmethod
+    def for_clearance(cls, clearance: ClearanceMap) -> "JumpTable":
+        """Returns the jump table of `clearance`, building it the first time it is needed"""
+        if cls not in clearance.derived:
+            clearance.derived[cls] = cls(clearance)
+        return clearance.derived[cls]
+
+    def scan(self, row: int, col: int, d_row: int, d_col: int, goal: State) -> bool:
+        """Returns True if walking from (row, col) along (d_row, d_col) reaches the goal cell or a turning point before a wall"""
+        if self.turn_steps[(d_row, d_col)][row][col] != -1:
+            return True
+        wall_steps = self.wall_steps[(d_row, d_col)][row][col]
+        if d_row == 0:
+            steps = (goal[1] - col) * d_col
+            return goal[0] == row and 0 < steps <= wall_steps
+        steps = (goal[0] - row) * d_row
+        return goal[1] == col and 0 < steps <= wall_steps
+
+
+def jump(
+    table: JumpTable, row: int, col: int, d_row: int, d_col: int, goal: State
+) -> Optional[Tuple[int, int]]:
+    """Walks from (row, col) along (d_row, d_col) and returns the first jump point, or None if a wall is hit first
+
+    A jump point is the goal cell, a turning point, the last cell before a wall, or a cell from which a
+    perpendicular scan finds one of those. These are the only cells where an optimal path needs to turn
+    """
+    wall_steps = table.wall_steps[(d_row, d_col)][row][col]
+    turn_steps = table.turn_steps[(d_row, d_col)][row][col]
+    for step in range(1, wall_steps + 1):
+        row, col = row + d_row, col + d_col
+        if (row, col) == goal[:2] or step == turn_steps or step == wall_steps:
+            return row, col
+        if table.scan(row, col, d_col, d_row, goal) or table.scan(
+            row, col, -d_col, -d_row, goal
+        ):
+            return row, col
+    return None
+
+
+def jump_neighbours(
+    state: State, cost: int, clearance: ClearanceMap, goal: State
+) -> Iterator[Tuple[State, int, Movement]]:
+    """Like `neighbours`, but forward and reverse moves jump straight to the next jump point instead of the next cell"""
+    row, col, bearing = state
+    d_row, d_col = BEARING_OFFSETS[bearing]
+    table = JumpTable.for_clearance(clearance)
+
+    for movement, sign in ((Movement.FORWARD, 1), (Movement.REVERSE, -1)):
+        jump_point = jump(table, row, col, sign * d_row, sign * d_col, goal)
+        if jump_point is not None:
+            steps = abs(jump_point[0] - row) + abs(jump_point[1] - col)
+            yield (*jump_point, bearing), cost * steps, movement
+    yield (row, col, LEFT_OF[bearing]), Cost.TURN_COST, Movement.LEFT
+    yield (row, col, RIGHT_OF[bearing]), Cost.TURN_COST, Movement.RIGHT
+
+
+class CostToGo:
+    """
+    Exact cost from every (row, col, bearing) state of an arena to one goal state, usable as the heuristic of a search
+
+    The field is computed with a backward wavefront over the whole configuration space at once - every sweep relaxes all
+    the forward and reverse moves, then all the turns, as NumPy array operations, until nothing changes. States that
+    cannot reach the goal cost infinity
+
+    Usage:
+        cost_to_go = CostToGo.for_goal(clearance, goal, cost)
+        cost_to_go(state)  # the cheapest cost from state to goal
+    """
+
+    def __init__(self, clearance: ClearanceMap, goal: State, cost: int):
+        self.goal = goal
+        self.cost = cost
+        free = ~clearance.blocked
+
+        # field[bearing // 2][row][col] is the cost from (row, col, bearing) to the goal
+        field = np.full((len(BEARING_OFFSETS), clearance.rows, clearance.cols), np.inf)
+        field[goal[2] // 2, goal[0], goal[1]] = 0
+        while True:
+            previous = field.copy()
+            for bearing, (d_row, d_col) in BEARING_OFFSETS.items():
+                # a move can only end on a free cell
+                ends = np.where(free, field[bearing // 2], np.inf) + cost
+                np.minimum(
+                    field[bearing // 2],
+                    self._shift(ends, d_row, d_col),
+                    out=field[bearing // 2],
+                )
+                np.minimum(
+                    field[bearing // 2],
+                    self._shift(ends, -d_row, -d_col),
+                    out=field[bearing // 2],
+                )
+            for bearing in BEARING_OFFSETS:
+                np.minimum(
+                    field[bearing // 2],
+                    np.minimum(
+                        field[LEFT_OF[bearing] // 2], field[RIGHT_OF[bearing] // 2]
+                    )
+                    + Cost.TURN_COST,
+                    out=field[bearing // 2],
+                )
+            if np.array_equal(field, previous):
+                break
+        self.field = field
+
+    @staticmethod
+    def _shift(array: np.ndarray, d_row: int, d_col: int) -> np.ndarray:
+        """Returns the array whose [row][col] is array[row + d_row][col + d_col], or infinity outside of the arena"""
+        rows, cols = array.shape
+        shifted = np.full_like(array, np.inf)
+        shifted[
+            max(-d_row, 0) : rows - max(d_row, 0), max(-d_col, 0) : cols - max(d_col, 0)
+        ] = array[
+            max(d_row, 0) : rows - max(-d_row, 0), max(d_col, 0) : cols - max(-d_col, 0)
+        ]
+        return shifted
+
+    @classmethod
+    def for_goal(cls, clearance: ClearanceMap, goal: State, cost: int) -> "CostToGo":
+        """Returns the cost-to-go field of `goal` in `clearance`, building it the first time it is needed"""
+        key = (cls, goal, cost)
+        if key not in clearance.derived:
+            clearance.derived[key] = cls(clearance, goal, cost)
+        return clearance.derived[key]
+
+    def __call__(self, state: State) -> float:
+        return self.field[state[2] // 2, state[0], state[1]]
+
+
+class ShortestPathTree:
+    """
+    Class to represent the shortest paths from one source state to every other state on the (row, col, bearing) lattice,
+    computed with Dijkstra's algorithm
+
+    A single tree answers both the driving cost of, and the path to, many goals. If `targets` is given, the search stops
+    as soon as all of them have been settled
+
+    The costs and parents of the states are kept in flat arrays indexed by `(row * cols + col) * 4 + bearing // 2`
+    rather than in dicts keyed by state, so a tree over a large arena takes a few bytes per state
+    """
+
+    def __init__(
+        self,
+        clearance: ClearanceMap,
+        cost: int,
+        source: State,
+        targets: Iterable[State] = None,
+    ):
+        self.clearance = clearance
+        self.source = source
+        size = clearance.rows * clearance.cols * len(BEARING_OFFSETS)
+        self._g = array("d", [math.inf]) * size
+        # index of the parent state, and the movement from the parent state - -1 and None for the source
+        self._parent = array("l", [-1]) * size
+        self._movement: List[Optional[Movement]] = [None] * size
+        self._settled = bytearray(size)
+        # True once every reachable state has been settled
+        self.exhausted = False
+        # the work done to build the tree - see PathResult
+        self.nodes_expanded = 0
+        self.nodes_generated = self.peak_open = 1
+        self.elapsed_ns = 0
+
+        started = time.perf_counter_ns()
+        self._search(cost, set(targets) if targets is not None else None)
+        self.elapsed_ns = time.perf_counter_ns() - started
+
+    def _index(self, state: State) -> Optional[int]:
+        """Returns the index of `state` in the arrays, or None if it is not on the lattice"""
+        row, col, bearing = state
+        if not (
+            0 <= row < self.clearance.rows
+            and 0 <= col < self.clearance.cols
+            and bearing in BEARING_OFFSETS
+        ):
+            return None
+        return (row * self.clearance.cols + col) * 4 + bearing // 2
+
+    def _state(self, index: int) -> State:
+        row, rest = divmod(index, self.clearance.cols * 4)
+        col, bearing = divmod(rest, 4)
+        return row, col, CARDINAL_BEARINGS[bearing]
+
+    def _search(self, cost: int, remaining: Optional[Set[State]]) -> None:
+        g_of, parent, movement_of, settled = (
+            self._g,
+            self._parent,
+            self._movement,
+            self._settled,
+        )
+        cols = self.clearance.cols
+        source = self._index(self.source)
+        g_of[source] = 0
+        # indices order states the same way as (row, col, bearing) tuples, so they break ties between equal costs
+        yet_to_visit_heap = [(0, source, self.source)]
+        while yet_to_visit_heap:
+            g, index, state = heapq.heappop(yet_to_visit_heap)
+            if settled[index]:
+                continue
+            settled[index] = 1
+            self.nodes_expanded += 1
+
+            if remaining is not None:
+                remaining.discard(state)
+                if not remaining:
+                    return
+
+            for position, step_cost, movement in neighbours(
+                state, cost, self.clearance
+            ):
+                child = (position[0] * cols + position[1]) * 4 + position[2] // 2
+                if g + step_cost < g_of[child]:
+                    g_of[child] = g + step_cost
+                    parent[child] = index
+                    movement_of[child] = movement
+                    heapq.heappush(yet_to_visit_heap, (g + step_cost, child, position))
+                    self.nodes_generated += 1
+                    self.peak_open = max(self.peak_open, len(yet_to_visit_heap))
+
+        self.exhausted = True
+
+    def _settled_index(self, state: State) -> Optional[int]:
+        """Returns the index of `state` if it has been settled, otherwise None"""
+        index = self._index(state)
+        return index if index is not None and self._settled[index] else None
+
+    def resolves(self, state: State) -> bool:
+        """Returns True if this tree knows for certain whether, and how, `state` can be reached"""
+        return self.exhausted or self._settled_index(state) is not None
+
+    def cost_to(self, state: State) -> Optional[int]:
+        """Returns the cost of the cheapest path from the source to `state`, or None if it was not reached"""
+        index = self._settled_index(state)
+        return int(self._g[index]) if index is not None else None
+
+    def reached(self) -> Iterator[Tuple[State, float, bool]]:
+        """Yields (state, cost from the source, settled) for every state the search reached. The cost of a state that
+        is not settled is the cheapest found so far
+        """
+        for index, g in enumerate(self._g):
+            if g != math.inf:
+                yield self._state(index), g, bool(self._settled[index])
+
+    def path_to(self, state: State) -> Optional[PathResult]:
+        """Returns the cheapest path from the source to `state`, or None if it was not reached"""
+        index = self._settled_index(state)
+        if index is None:
+            return None
+
+        cost = int(self._g[index])
+        states, movements = [state], []
+        while self._parent[index] != -1:
+            movements.append(self._movement[index])
+            index = self._parent[index]
+            states.append(self._state(index))
+        states[-1] = self.source
+        states.reverse()
+        movements.reverse()
+        return PathResult(states, movements, cost)
 
 
 def is_adjacent_to_any_obstacle(
@@ -73,189 +796,338 @@ def is_adjacent_to_any_obstacle(
     )
 
 
-def search(maze, cost, start, end, obstacles: List[Obstacle]):
+def search(
+    maze, cost, start, end, obstacles: List[Obstacle], clearance: ClearanceMap = None
+):
     """
-    Returns a list of tuples as a path from the given start to the given end in the given maze
+    Returns the path from the given start to the given end in the given maze, as a matrix where every cell on the path holds
+    its step number (0 for `start`) and every other cell holds -1. Returns None if there is no path
+
+    This is a compatibility view of `find_path`, which should be preferred as it also returns the bearings and movements
     """
-    logger.debug(f"Searching for a path from (y, x, direction) = {start} to {end}")
+    result = find_path(maze, cost, start, end, obstacles, clearance)
+    if result.status == SearchStatus.UNREACHABLE:
+        return None
+    return result.to_matrix(maze)
 
-    # Create start and end node with initized values for g, h and f
-    start_node = Node(None, tuple(start))
-    start_node.g = start_node.h = start_node.f = 0
-    end_node = Node(None, tuple(end))
-    end_node.g = end_node.h = end_node.f = 0
 
-    # Initialize both yet_to_visit and visited list
-    # in this list we will put all node that are yet_to_visit for exploration.
-    # From here we will find the lowest cost node to expand next
-    yet_to_visit_list = []
-    # in this list we will put all node those already explored so that we don't explore it again
-    visited_list = []
+def find_path(
+    maze,
+    cost,
+    start,
+    end,
+    obstacles: List[Obstacle],
+    clearance: ClearanceMap = None,
+    engine: SearchEngine = SearchEngine.ASTAR,
+    epsilon: float = config.search_epsilon,
+    node_budget: int = config.search_node_budget,
+    cost_to_go: Optional[CostToGo] = None,
+    primitives: Optional[MotionPrimitives] = None,
+) -> PathResult:
+    """
+    Returns the path from the given start to the given end in the given maze. The result's status says whether the end
+    was reached, cannot be reached, or the search ran out of `node_budget` expansions first
+
+    `start` and `end` are (row, col, direction) positions, where direction is encoded as 10 (N), 11 (E), 12 (S) or 13 (W).
+    The search runs over (row, col, bearing) states, where forward and reverse moves cost `cost` and left and right
+    turns cost `Cost.TURN_COST`, and only finishes once the robot is at `end` AND facing `end`'s direction
 
-    # Add the start node
-    yet_to_visit_list.append(start_node)
+    `clearance` is the configuration space of `maze`. If it is not provided, it is computed from `maze` and `obstacles`
 
-    # Adding a stop condition. This is to avoid any infinite loop and stop
-    # execution after some reasonable number of steps
-    outer_iterations = 0
-    max_iterations = (len(maze) // 2) ** 5
+    `engine` selects the search algorithm. Every engine returns a path of the same (optimal) cost
 
-    # what squares do we search . serarch movement is left-right-top-bottom
-    # (4 movements) from every positon
+    `epsilon` >= 1 trades optimality for speed - the heuristic is inflated by `epsilon`, so fewer states are expanded
+    and the path found costs at most `epsilon` times the optimal cost
 
-    move = [[-1, 0], [0, 1], [1, 0], [0, -1]]  # go up  # go right  # go down  # go left
+    `cost_to_go` is the exact cost-to-go field of `end` (see `CostToGo.for_goal`). When it is given, the A* and JPS
+    engines use it instead of `heuristic` and only expand states on the cheapest paths. The bidirectional engine ignores it
 
+    `primitives` replaces the 4-connected lattice with the given motion primitives (e.g. diagonal moves and arcs), which
+    are always searched with A*. `engine` and `cost_to_go` only apply to the 4-connected lattice and are ignored
     """
-        1) We first get the current node by comparing all f cost and selecting the lowest cost node for further expansion
-        2) Check max iteration reached or not . Set a message and stop execution
-        3) Remove the selected node from yet_to_visit list and add this node to visited list
-        4) Perofmr Goal test and return the path else perform below steps
-        5) For selected node find out all children (use move to find children)
-            a) get the current postion for the selected node (this becomes parent node for the children)
-            b) check if a valid position exist (boundary will make few nodes invalid)
-            c) if any node is a wall then ignore that
-            d) add to valid children node list for the selected parent
-
-            For all the children node
-                a) if child in visited list then ignore it and try next node
-                b) calculate child node g, h and f values
-                c) if child in yet_to_visit list then ignore it
-                d) else move the child to yet_to_visit list
+    logger.debug(
+        f"Searching for a path from (y, x, direction) = {start} to {end} using {engine.value}"
+    )
+
+    if clearance is None:
+        clearance = ClearanceMap(maze, obstacles)
+
+    goal = to_state(end)
+
+    # Identical (arena, start, end) legs are only ever searched once
+    cache_key = (
+        clearance.fingerprint,
+        to_state(start),
+        goal,
+        cost,
+        engine,
+        epsilon,
+        node_budget,
+        cost_to_go is not None,
+        primitives,
+    )
+    cached = leg_cache.get(cache_key, MISSING)
+    if cached is not MISSING:
+        logger.debug("Reusing cached path")
+        return cached
+
+    started = time.perf_counter_ns()
+    if primitives is not None:
+        successors = functools.partial(
+            primitives.successors, cost=cost, clearance=clearance
+        )
+        estimate = functools.partial(primitives.heuristic, goal=goal, cost=cost)
+        result = _find_path(start, goal, successors, estimate, epsilon, node_budget)
+    elif engine == SearchEngine.BIDIRECTIONAL:
+        result = _find_path_bidirectional(
+            cost, start, goal, clearance, epsilon, node_budget
+        )
+    else:
+        if engine == SearchEngine.JPS:
+            successors = functools.partial(
+                jump_neighbours, cost=cost, clearance=clearance, goal=goal
+            )
+        else:
+            successors = functools.partial(neighbours, cost=cost, clearance=clearance)
+        if cost_to_go is None:
+            estimate = functools.partial(heuristic, goal=goal, cost=cost)
+        else:
+            estimate = cost_to_go
+        result = _find_path(start, goal, successors, estimate, epsilon, node_budget)
+    result.elapsed_ns = time.perf_counter_ns() - started
+    leg_cache.put(cache_key, result)
+    return result
+
+
+def _find_path(
+    start,
+    goal: State,
+    successors: Callable[[State], Iterable[Tuple[State, int, Step]]],
+    estimate: Callable[[State], float],
+    epsilon: float,
+    node_budget: int,
+) -> PathResult:
+    """Weighted A* search over the (row, col, bearing) lattice, where `successors` yields the children of a state and
+    `estimate` is the heuristic cost from a state to `goal` - see `find_path`
+
+    With a consistent heuristic, expanding every state at most once (no re-opening) still keeps the path within
+    `epsilon` times the optimal cost
     """
-    # find maze has got how many rows and columns
-    no_rows, no_columns = np.shape(maze)
+    # Create start node with initized values for g, h and f
+    start_node = Node(None, to_state(start))
+    start_node.g = 0
+    start_node.h = estimate(start_node.position)
+    start_node.f = epsilon * start_node.h
 
-    # Loop until you find the end
+    # The yet_to_visit heap holds (f, h, tie_breaker, node) entries so the lowest cost node
+    # is popped in O(log n). Equal f values prefer the node closest to the goal, then keep
+    # insertion order, and the tie breaker stops heapq from ever comparing two Node objects
+    tie_breaker = itertools.count()
+    yet_to_visit_heap = [(start_node.f, start_node.h, next(tie_breaker), start_node)]
+    # best known g for every (row, col, bearing) state that has been pushed onto the heap
+    best_g = {start_node.position: start_node.g}
+    # (row, col, bearing) states that have already been expanded, so we don't explore them again
+    visited_set = set()
+    # number of nodes pushed onto the heap, and the largest the heap has been
+    nodes_generated, peak_open = 1, 1
 
-    while len(yet_to_visit_list) > 0:
+    # Loop until you find the end
 
-        # Every time any node is referred from yet_to_visit list, counter of limit operation incremented
-        outer_iterations += 1
+    while len(yet_to_visit_heap) > 0:
 
         # Get the current node
-        current_node = yet_to_visit_list[0]
-        current_index = 0
-        for index, item in enumerate(yet_to_visit_list):
-            if item.f < current_node.f:
-                current_node = item
-                current_index = index
-
-        # if we hit this point return the path such as it may be no solution or
-        # computation cost is too high
-        if outer_iterations > max_iterations:
-            logger.error("giving up on pathfinding too many iterations")
-            return return_path(current_node, maze)
-
-        # Pop current node out off yet_to_visit list, add to visited list
-        yet_to_visit_list.pop(current_index)
-        visited_list.append(current_node)
+        *_, current_node = heapq.heappop(yet_to_visit_heap)
 
-        # test if goal is reached or not, if yes then return the path
-        if (
-            current_node.position[0] == end_node.position[0]
-            and current_node.position[1] == end_node.position[1]
-        ):
-            return return_path(current_node, maze)
+        # A cheaper copy of this state was already expanded - this entry is stale
+        if current_node.position in visited_set:
+            continue
 
-        # Generate children from all adjacent squares
-        children = []
-        i = 0
+        # Stop once the budget is spent, returning the path to the most promising node so far
+        if len(visited_set) >= node_budget:
+            logger.error(f"giving up on pathfinding after {node_budget} expansions")
+            return PathResult.from_node(
+                current_node,
+                SearchStatus.BUDGET_EXHAUSTED,
+                len(visited_set),
+                nodes_generated,
+                peak_open,
+            )
 
-        for new_position in move:
-            direction = [10, 11, 12, 13]
+        visited_set.add(current_node.position)
 
-            # Get node position
-            node_position = [
-                current_node.position[0] + new_position[0],
-                current_node.position[1] + new_position[1],
-                direction[i],
-            ]
-            i += 1
-            # Make sure within range (check if within maze boundary)
-            # Make sure there is at least `Distance.MIN_SEPARATION.value`
-            # horizontal and vertical buffer between robot and any obstacle
-            if (
-                node_position[0] > (no_rows - 1)
-                or node_position[0] < 0
-                or node_position[1] > (no_columns - 1)
-                or node_position[1] < 0
-                or is_adjacent_to_any_obstacle(
-                    node_position[1],
-                    node_position[0],
-                    Distance.MIN_SEPARATION.value,
-                    obstacles,
-                )
-            ):
-                continue
+        # test if goal is reached or not, if yes then return the path
+        if current_node.position == goal:
+            logger.debug(f"Found a path after expanding {len(visited_set)} nodes")
+            return PathResult.from_node(
+                current_node,
+                SearchStatus.FOUND,
+                len(visited_set),
+                nodes_generated,
+                peak_open,
+            )
 
-            # Make sure walkable terrain
-            if maze[node_position[0]][node_position[1]] in [1, 10, 11, 12, 13]:
+        # Every child is either a forward/reverse move within the configuration space, or a turn on the spot
+        for position, step_cost, movement in successors(current_node.position):
+            # Child is in the visited set
+            if position in visited_set:
                 continue
 
-            # Create new node
-            new_node = Node(current_node, node_position)
-            # Append
-            children.append(new_node)
-
-        # Loop through children
-        for child in children:
-            tempCost = cost
-
-            # Child is on the visited list (search entire visited list)
-            if (
-                len(
-                    [
-                        visited_child
-                        for visited_child in visited_list
-                        if visited_child == child
-                    ]
-                )
-                > 0
-            ):
-                continue
+            g = current_node.g + step_cost
 
-            # Increase the cost of turning by 2x
-            # Robot facing North or South and making Left/Right turns
-            if child.parent.position[2] in [10, 12]:
-                if [
-                    child.position[0] - child.parent.position[0],
-                    child.position[1] - child.parent.position[1],
-                ] == move[1]:
-                    tempCost *= 2
-                    child.position[2] = 11
-                elif [
-                    child.position[0] - child.parent.position[0],
-                    child.position[1] - child.parent.position[1],
-                ] == move[3]:
-                    tempCost *= 2
-                    child.position[2] = 13
-            # Robot facing East or West and making Left/Right turns
-            elif child.parent.position[2] in [11, 13]:
-                if [
-                    child.position[0] - child.parent.position[0],
-                    child.position[1] - child.parent.position[1],
-                ] == move[0]:
-                    tempCost *= 2
-                    child.position[2] = 10
-                elif [
-                    child.position[0] - child.parent.position[0],
-                    child.position[1] - child.parent.position[1],
-                ] == move[2]:
-                    tempCost *= 2
-                    child.position[2] = 12
+            # Child is already in the yet_to_visit heap and g cost is already lower
+            if g >= best_g.get(position, float("inf")):
+                continue
 
             # Create the f, g, and h values
-            child.g = current_node.g + tempCost
-            # Heuristic costs calculated here, this is using eucledian distance
-            child.h = ((child.position[0] - end_node.position[0]) ** 2) + (
-                (child.position[1] - end_node.position[1]) ** 2
+            child = Node(current_node, position, movement)
+            child.g = g
+            child.h = estimate(position)
+            # The goal cannot be reached from this child
+            if child.h == float("inf"):
+                continue
+            child.f = child.g + epsilon * child.h
+
+            # Add the child to the yet_to_visit heap
+            best_g[position] = child.g
+            heapq.heappush(
+                yet_to_visit_heap, (child.f, child.h, next(tie_breaker), child)
             )
+            nodes_generated += 1
+            peak_open = max(peak_open, len(yet_to_visit_heap))
 
-            child.f = child.g + child.h
+    logger.error(f"No path exists from (y, x, direction) = {start} to {goal}")
+    return PathResult.unreachable(
+        start_node.position, len(visited_set), nodes_generated, peak_open
+    )
+
+
+def _find_path_bidirectional(
+    cost,
+    start,
+    goal: State,
+    clearance: ClearanceMap,
+    epsilon: float,
+    node_budget: int,
+) -> PathResult:
+    """Bidirectional A* search over the (row, col, bearing) lattice - see `find_path`
+
+    One search runs forward from `start` and one runs backward from `goal`, always expanding the side with the smaller
+    frontier. Every edge of the lattice can be driven both ways at the same cost, so the backward search simply follows
+    `neighbours` and records the inverse movement.
+
+    Both searches use the average potential p(v) = (h(v, goal) - h(v, start)) / 2, forward with +p and backward with -p,
+    which keeps both consistent. The two smallest keys add up to a lower bound on any path not found yet, so the search
+    stops once the cheapest meeting found so far is within `epsilon` times that bound
+    """
+    source = to_state(start)
+
+    def potential(state: State) -> float:
+        return (heuristic(state, goal, cost) - heuristic(state, source, cost)) / 2
+
+    FORWARD_SIDE, BACKWARD_SIDE = 0, 1
+    signs = (1, -1)
+    g = ({source: 0}, {goal: 0})
+    # forward: state -> (previous state, movement from the previous state to this state)
+    # backward: state -> (next state, movement from this state to the next state)
+    links = ({source: None}, {goal: None})
+    heaps = ([(potential(source), source)], [(-potential(goal), goal)])
+    settled = (set(), set())
+    # number of states pushed onto either heap, and the largest both heaps have been together
+    nodes_generated, peak_open = 2, 2
+
+    best_cost, meeting = (0, source) if source == goal else (float("inf"), None)
+    status = SearchStatus.FOUND
+
+    while heaps[FORWARD_SIDE] and heaps[BACKWARD_SIDE]:
+        # No path through an unexpanded state can be cheaper than the best meeting (divided by epsilon)
+        if (
+            epsilon * (heaps[FORWARD_SIDE][0][0] + heaps[BACKWARD_SIDE][0][0])
+            >= best_cost
+        ):
+            break
 
-            # Child is already in the yet_to_visit list and g cost is already lower
-            if len([i for i in yet_to_visit_list if child == i and child.g > i.g]) > 0:
+        side = (
+            FORWARD_SIDE
+            if len(heaps[FORWARD_SIDE]) <= len(heaps[BACKWARD_SIDE])
+            else BACKWARD_SIDE
+        )
+        _, state = heapq.heappop(heaps[side])
+        # A cheaper copy of this state was already expanded - this entry is stale
+        if state in settled[side]:
+            continue
+
+        if len(settled[FORWARD_SIDE]) + len(settled[BACKWARD_SIDE]) >= node_budget:
+            logger.error(f"giving up on pathfinding after {node_budget} expansions")
+            status = SearchStatus.BUDGET_EXHAUSTED
+            break
+        settled[side].add(state)
+
+        for position, step_cost, movement in neighbours(state, cost, clearance):
+            g_position = g[side][state] + step_cost
+            if g_position >= g[side].get(position, float("inf")):
                 continue
 
-            # Add the child to the yet_to_visit list
-            yet_to_visit_list.append(child)
+            g[side][position] = g_position
+            links[side][position] = (
+                (state, movement)
+                if side == FORWARD_SIDE
+                else (state, INVERSE_MOVEMENT[movement])
+            )
+            heapq.heappush(
+                heaps[side], (g_position + signs[side] * potential(position), position)
+            )
+            nodes_generated += 1
+            peak_open = max(
+                peak_open, len(heaps[FORWARD_SIDE]) + len(heaps[BACKWARD_SIDE])
+            )
+
+            # The two searches meet at `position`
+            g_other = g[1 - side].get(position)
+            if g_other is not None and g_position + g_other < best_cost:
+                best_cost, meeting = g_position + g_other, position
+
+    nodes_expanded = len(settled[FORWARD_SIDE]) + len(settled[BACKWARD_SIDE])
+    if meeting is not None:
+        # a complete path, even if the budget ran out before it was proven to be within epsilon of the cheapest
+        status = SearchStatus.FOUND
+    elif status == SearchStatus.BUDGET_EXHAUSTED:
+        # end at the forward state closest to the goal, as the A* engines do
+        meeting = min(
+            settled[FORWARD_SIDE] or {source},
+            key=lambda state: heuristic(state, goal, cost),
+        )
+        best_cost = g[FORWARD_SIDE][meeting]
+        links[BACKWARD_SIDE][meeting] = None
+    elif meeting is None:
+        logger.error(f"No path exists from (y, x, direction) = {start} to {goal}")
+        return PathResult.unreachable(
+            source, nodes_expanded, nodes_generated, peak_open
+        )
+
+    # start -> meeting, following the forward links back from the meeting state
+    states, movements = [meeting], []
+    state = meeting
+    while links[FORWARD_SIDE][state] is not None:
+        state, movement = links[FORWARD_SIDE][state]
+        states.append(state)
+        movements.append(movement)
+    states.reverse()
+    movements.reverse()
+
+    # meeting -> goal, following the backward links
+    state = meeting
+    while links[BACKWARD_SIDE][state] is not None:
+        state, movement = links[BACKWARD_SIDE][state]
+        states.append(state)
+        movements.append(movement)
+
+    logger.debug(f"Found a path after expanding {nodes_expanded} nodes")
+    return PathResult(
+        states,
+        movements,
+        best_cost,
+        status,
+        nodes_expanded,
+        nodes_generated,
+        peak_open,
+    )
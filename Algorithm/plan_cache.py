@@ -0,0 +1,73 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+import config
+from setup_logger import logger
+
+# Returned by LegCache.get on a miss, since None is a valid cached value
+MISSING = object()
+
+
+class LegCache:
+    """
+    A bounded least-recently-used cache of planned legs
+
+    Keys are tuples of (arena fingerprint, start, end, move cost, ...), so re-planning a leg in an unchanged arena
+    returns the previous result instead of searching again. Legs of different arenas never share a key, so one
+    cache can serve several arenas, and it is safe to use from several threads
+    """
+
+    def __init__(self, maxsize: int = config.leg_cache_size):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the cached value for `key` and marks it as most recently used, or `default` on a miss"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Caches `value` under `key`, evicting the least recently used entry if the cache is full"""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self, fingerprint: Optional[int] = None) -> None:
+        """
+        Drops the cached legs of the arena with the `fingerprint`, or every cached leg if it is None. Legs of a changed
+        arena are never returned, as its key differs, but dropping them frees room for the legs of the new arena
+        """
+        with self._lock:
+            stale = [
+                key
+                for key in self._entries
+                if fingerprint is None or key[0] == fingerprint
+            ]
+            if stale:
+                logger.debug(
+                    f"Clearing {len(stale)} cached legs (hits={self.hits}, misses={self.misses})"
+                )
+            for key in stale:
+                del self._entries[key]
+
+
+# Shared by every planner in this process
+leg_cache = LegCache()
@@ -1,18 +1,21 @@
-import math
 import sys
 import time
 
 from constants import *
 from fastest_path_algo import FastestPath
+from hierarchical_path_algo import HierarchicalPlanner
+from incremental_path_algo import DStarLite
 from map import *
 from path_find_algo import *
+from search_stats import MissionStats, SearchStats
 from setup_logger import logger
 
 
 class Robot:
     def __init__(self, simulator):
         self.simulator = simulator
-        self.map: Map = Map()
+        # the arena is shared with the simulator, which builds it and draws it
+        self.map: Map = simulator.map
         self.y: int = config.map_size["height"] - 2
         self.x: int = 1
         #  self.y: int = 6  # robot initial position
@@ -22,7 +25,13 @@ class Robot:
         #  self.bearing: Bearing = Bearing.EAST
         self.update_map: bool = True
         self.robot_rpi_temp_movement: List[str] = []
-        self.prev_loc = (1, 18, Bearing.NORTH)  # (x, y, Bearing)
+        self.prev_loc = (1, self.y, Bearing.NORTH)  # (x, y, Bearing)
+        # (row, col, bearing) waypoint -> shortest paths from that waypoint, reused to plan the legs between waypoints
+        self.shortest_path_trees: Dict[State, ShortestPathTree] = {}
+        # end of a leg -> incremental planner kept across runs, so obstacle edits only repair the affected region
+        self.incremental_planners: Dict[State, DStarLite] = {}
+        # every search done for the latest mission, shown in the simulator's text area
+        self.mission_stats = MissionStats()
 
     def validate(self, x, y):
         if (
@@ -77,7 +86,7 @@ class Robot:
         self.y = config.map_size["height"] - 2
         self.x = 1
         self.bearing = Bearing.NORTH
-        self.prev_loc = (1, 18, Bearing.NORTH)
+        self.prev_loc = (1, self.y, Bearing.NORTH)
 
     def check_front(self):
         if (
@@ -107,28 +116,16 @@ class Robot:
 
     # check obstacles
     def north_is_free(self):
-        for i in range(3):
-            if map_sim[self.y - 2][self.x - i + 1] in [10, 11, 12, 13]:
-                return False
-        return True
+        return self.map.clearance().footprint_is_free(self.y - 1, self.x)
 
     def south_is_free(self):
-        for i in range(3):
-            if map_sim[self.y + 2][self.x - i + 1] in [10, 11, 12, 13]:
-                return False
-        return True
+        return self.map.clearance().footprint_is_free(self.y + 1, self.x)
 
     def east_is_free(self):
-        for i in range(3):
-            if map_sim[self.y - i + 1][self.x + 2] in [10, 11, 12, 13]:
-                return False
-        return True
+        return self.map.clearance().footprint_is_free(self.y, self.x + 1)
 
     def west_is_free(self):
-        for i in range(3):
-            if map_sim[self.y - i + 1][self.x - 2] in [10, 11, 12, 13]:
-                return False
-        return True
+        return self.map.clearance().footprint_is_free(self.y, self.x - 1)
 
     def get_target_movement(self, from_dir: Bearing, to_dir) -> None:
         if from_dir == to_dir:
@@ -161,9 +158,10 @@ class Robot:
         self.robot_rpi_temp_movement.extend(movements[from_dir][to_dir])
         self.bearing = Bearing.int_to_bearing(to_dir)
 
-    def fastestPath(self, maze):
+    def fastestPath(self, maze, display: bool = True):
+        """Plans the mission through the simulator's goal pairs - see `hamiltonian_path_search`"""
         self.simulator.temp_pairs = []
-        start = [1, 18, 10]
+        start = [1, config.map_size["height"] - 2, 10]
         target_states = []
         g = self.simulator.goal_pairs
         g.insert(0, start)
@@ -210,20 +208,53 @@ class Robot:
 
         self.encoded_pairs = encoded_pairs
         logger.debug(f"encoded_pairs: {encoded_pairs}")
-        dist = []
-        for i in g:
-            temp = []
-            for j in g:
-                if i == j:
-                    temp.append(sys.maxsize)
-                else:
-                    sqr = pow(i[0] - j[0], 2) + pow(i[1] - j[1], 2)
-                    root = math.sqrt(sqr)
-                    temp.append(root)
-            dist.append(temp)
+
+        # dist[i][j] is the real cost of driving from waypoint i, facing its heading, to waypoint j, facing its heading -
+        # moves, turns and detours around obstacles included
+        clearance = self.map.clearance()
+        waypoints = [to_state([i[1], i[0], i[2]]) for i in g]
+        self.mission_stats = MissionStats()
+        # Repair the search around every waypoint that an earlier run on an arena of the same size already searched
+        # from - the planner kept for it, or else its shortest path tree - so that moving a few obstacles only
+        # re-expands the states they affect
+        planners = {}
+        if config.incremental_replanning:
+            for waypoint in waypoints:
+                planner = self.incremental_planner(clearance, waypoint, waypoint)
+                if planner is not None:
+                    planners[waypoint] = planner
+        self.incremental_planners = planners
+        # One Dijkstra per remaining waypoint gives the cost to every other waypoint, whatever the size of the arena -
+        # it is cheaper than planning each of the n * (n - 1) legs. The same trees are reused by
+        # hamiltonian_path_search, so no leg is planned twice
+        self.shortest_path_trees = {
+            waypoint: ShortestPathTree(clearance, Cost.MOVE_COST, waypoint, waypoints)
+            for waypoint in waypoints
+            if waypoint not in planners
+        }
+        for waypoint, tree in self.shortest_path_trees.items():
+            self.mission_stats.record(
+                SearchStats.from_tree(f"tree from {waypoint[:2]}", tree)
+            )
+        dist = [self.waypoint_costs(waypoint, waypoints) for waypoint in waypoints]
+        # Unreachable waypoints still need a place in the order, but should be visited last. Charging more than every
+        # reachable leg put together sorts them after all of those, however large the arena
+        penalty = 1 + sum(
+            leg for row in dist for leg in row if leg is not None and leg != sys.maxsize
+        )
+        dist = [[penalty if leg is None else leg for leg in row] for row in dist]
         n = len(g)
         fastest_path = FastestPath()
+        started = time.perf_counter_ns()
         path = fastest_path.plan_path(dist, n)
+        # the tour's cost is the sum of its legs, which record their own costs
+        self.mission_stats.record(
+            SearchStats(
+                f"waypoint order ({fastest_path.mode.value})",
+                elapsed_ns=time.perf_counter_ns() - started,
+            )
+        )
+        logger.debug(f"Waypoint order {path} costs {fastest_path.min_cost}")
         logger.debug(path)
         for i in path:
             if i != 0:
@@ -243,7 +274,7 @@ class Robot:
                 tempGoal = [x[0] - Distance.IMAGE_CAPTURE.value, x[1]]
             self.simulator.temp_pairs.append(tempGoal)
 
-        self.hamiltonian_path_search(maze, target_states)
+        self.hamiltonian_path_search(maze, target_states, display)
 
     ###########################################################################################
     def fastestCar(self):
@@ -406,73 +437,150 @@ class Robot:
 
     ########################################################################################
 
-    def hamiltonian_path_search(self, maze, target_states):
-        start = [18, 1, 10]
+    def waypoint_costs(
+        self, source: State, waypoints: List[State]
+    ) -> List[Optional[int]]:
+        """Returns the cost from `source` to every waypoint - None if it is unreachable, and sys.maxsize to `source`
+        itself - from the shortest path tree from `source`, or else the planner towards it
+        """
+        tree = self.shortest_path_trees.get(source)
+        if tree is not None:
+            return [
+                sys.maxsize if waypoint == source else tree.cost_to(waypoint)
+                for waypoint in waypoints
+            ]
+
+        # edges can be driven both ways at the same cost, so the cost to `source` from a waypoint is the cost from it
+        planner = self.incremental_planners[source]
+        costs, stats = [], SearchStats(f"repair to {source[:2]}")
+        started = time.perf_counter_ns()
+        for waypoint in waypoints:
+            if waypoint == source:
+                costs.append(sys.maxsize)
+                continue
+            planner.update_start(waypoint)
+            result = planner.plan()
+            costs.append(result.cost if result.reached_goal else None)
+            stats.nodes_expanded += result.nodes_expanded
+            stats.nodes_generated += result.nodes_generated
+            stats.peak_open = max(stats.peak_open, result.peak_open)
+        stats.elapsed_ns = time.perf_counter_ns() - started
+        self.mission_stats.record(stats)
+        return costs
+
+    def incremental_planner(
+        self, clearance: ClearanceMap, start: State, goal: State
+    ) -> Optional[DStarLite]:
+        """Returns a planner for the leg from `start` to `goal` in `clearance`, which repairs an earlier search towards
+        `goal` - the planner kept from the previous run, or else the shortest path tree from `goal`. Returns None if
+        there is no earlier search to repair
+        """
+        planner = self.incremental_planners.get(goal)
+        if (
+            planner is not None
+            and planner.clearance.blocked.shape != clearance.blocked.shape
+        ):
+            # the arena was resized, so there is nothing to repair
+            planner = None
+        if planner is None:
+            tree = self.shortest_path_trees.get(goal)
+            if tree is None or tree.clearance.blocked.shape != clearance.blocked.shape:
+                return None
+            planner = self.incremental_planners[goal] = DStarLite.from_tree(
+                tree, Cost.MOVE_COST, start
+            )
+        if planner.start != start:
+            # the robot did not stop where it did in the previous run, e.g. an earlier leg was re-planned
+            planner.update_start(start)
+        if planner.clearance is not clearance:
+            planner.update_clearance(clearance)
+        return planner
+
+    def plans_hierarchically(self, clearance: ClearanceMap) -> bool:
+        """Returns True if legs in `clearance` that no shortest path tree serves are planned with a HierarchicalPlanner -
+        see `config.hierarchical_min_cells`
+        """
+        return (
+            config.hierarchical_min_cells is not None
+            and clearance.rows * clearance.cols >= config.hierarchical_min_cells
+        )
+
+    def hamiltonian_path_search(self, maze, target_states, display: bool = True):
+        """Plans the legs through `target_states` in order, into the simulator's robot_movement and movement_to_rpi.
+        If `display`, the simulator then replays the movements - otherwise the caller starts the replay with
+        `displayMovement` when it is ready
+        """
+        start = [config.map_size["height"] - 2, 1, 10]
         end = [
             target_states[0][1],
             target_states[0][0],
             target_states[0][2],
         ]  # ending position
-        cost = 10  # cost per movement
+        cost = Cost.MOVE_COST  # cost per forward or reverse movement
+        clearance = self.map.clearance()
         for i in range(len(target_states)):
-            self.simulator.robot_temp_movement = []
             self.robot_rpi_temp_movement = []
-            path = search(maze, cost, start, end, self.simulator.obstacles)
-
-            # Path movement
-            num_moves = len([num for row in path for num in row if num not in [-1, 0]])
-            self.simulator.robot_temp_movement = [None] * num_moves
-            for row in range(len(path)):
-                for item in range(len(path[row])):
-                    if path[row][item] not in [-1, 0]:
-                        self.simulator.robot_temp_movement[path[row][item] - 1] = [
-                            row,
-                            item,
-                        ]
-
-            tempStart = start
-            for j in range(len(self.simulator.robot_temp_movement)):
-                move = [
-                    [tempStart[0] - 1, tempStart[1]],  # N
-                    [tempStart[0], tempStart[1] + 1],  # E
-                    [tempStart[0] + 1, tempStart[1]],  # S
-                    [tempStart[0], tempStart[1] - 1],  # W
-                ]
-                direction = [Bearing.NORTH, Bearing.EAST, Bearing.SOUTH, Bearing.WEST]
-
-                # Find the ONE AND ONLY coordinate in `move` which matches self.simulator.robot_temp_movement[j]
-                for k in range(len(move)):
-                    if move[k] in self.simulator.robot_temp_movement:
-                        if self.bearing == direction[k]:
-                            self.simulator.robot_movement.append(Movement.FORWARD)
-                            self.robot_rpi_temp_movement.append(Movement.FORWARD)
-                            tempStart = move[k]
-                            self.simulator.robot_temp_movement.remove(tempStart)
-                            break
-                        elif self.bearing == direction[(k + 2) % 4]:
-                            self.simulator.robot_movement.append(Movement.REVERSE)
-                            self.robot_rpi_temp_movement.append(Movement.REVERSE)
-                            tempStart = move[k]
-                            self.simulator.robot_temp_movement.remove(tempStart)
-                            break
-                        elif self.bearing == direction[(k + 1) % 4]:
-                            self.simulator.robot_movement.append(Movement.LEFT)
-                            self.simulator.robot_movement.append(Movement.FORWARD)
-                            self.robot_rpi_temp_movement.append(Movement.LEFT)
-                            self.robot_rpi_temp_movement.append(Movement.FORWARD)
-                            self.bearing = Bearing.prev_bearing(self.bearing)
-                            tempStart = move[k]
-                            self.simulator.robot_temp_movement.remove(tempStart)
-                            break
-                        elif self.bearing == direction[(k + 3) % 4]:
-                            self.simulator.robot_movement.append(Movement.RIGHT)
-                            self.simulator.robot_movement.append(Movement.FORWARD)
-                            self.robot_rpi_temp_movement.append(Movement.RIGHT)
-                            self.robot_rpi_temp_movement.append(Movement.FORWARD)
-                            self.bearing = Bearing.next_bearing(self.bearing)
-                            tempStart = move[k]
-                            self.simulator.robot_temp_movement.remove(tempStart)
-                            break
+
+            started = time.perf_counter_ns()
+            # Reuse the shortest path tree built by fastestPath for this arena if there is one
+            tree = self.shortest_path_trees.get(to_state(start))
+            if (
+                tree is not None
+                and tree.clearance is clearance
+                and tree.resolves(to_state(end))
+            ):
+                result = tree.path_to(to_state(end))
+            else:
+                planner = (
+                    self.incremental_planner(clearance, to_state(start), to_state(end))
+                    if config.incremental_replanning
+                    else None
+                )
+                if planner is not None:
+                    # The arena changed since the leg was last searched - repair that search instead of starting over
+                    result = planner.plan()
+                elif self.plans_hierarchically(clearance):
+                    result = HierarchicalPlanner.for_clearance(clearance, cost).plan(
+                        to_state(start), to_state(end)
+                    )
+                else:
+                    result = find_path(
+                        maze,
+                        cost,
+                        start,
+                        end,
+                        self.simulator.obstacles,
+                        clearance,
+                        SearchEngine(config.search_engine),
+                        cost_to_go=(
+                            CostToGo.for_goal(clearance, to_state(end), cost)
+                            if config.search_cost_to_go
+                            else None
+                        ),
+                    )
+
+            elapsed_ns = time.perf_counter_ns() - started
+            label = f"leg {start[:2]} -> {end[:2]}"
+            if result is None:
+                stats = SearchStats(label, elapsed_ns=elapsed_ns)
+            else:
+                stats = SearchStats.from_result(label, result, elapsed_ns)
+            self.mission_stats.record(stats)
+
+            if result is None or result.status == SearchStatus.UNREACHABLE:
+                logger.error(f"Unable to reach {end} from {start}. Skipping it")
+                self.simulator.robot_temp_movement = []
+                row, col = start[0], start[1]
+            else:
+                if result.status == SearchStatus.BUDGET_EXHAUSTED:
+                    logger.warning(
+                        f"Ran out of search budget on the way to {end}. Stopping at {result.states[-1]}"
+                    )
+                # Path movement - the states and movements are already in the order the robot executes them
+                self.simulator.robot_temp_movement = result.states
+                self.simulator.robot_movement.extend(result.movements)
+                self.robot_rpi_temp_movement.extend(result.movements)
+                row, col, self.bearing = result.states[-1]
 
             self.get_target_movement(
                 self.bearing, Bearing.conversion_robot(target_states[i][2])
@@ -480,7 +588,8 @@ class Robot:
             self.simulator.robot_movement.append(Movement.STOP)
             self.robot_rpi_temp_movement.append(Movement.STOP)
             self.simulator.movement_to_rpi.append(self.robot_rpi_temp_movement)
-            start = end
+            # the next leg starts wherever the robot actually stopped
+            start = [row, col, Bearing.conversion_sim(self.bearing)]
             if i + 1 < len(target_states):
                 end = [
                     target_states[i + 1][1],
@@ -488,8 +597,19 @@ class Robot:
                     target_states[i + 1][2],
                 ]
 
+        # only keep the planners towards this mission's waypoints, which fastestPath repairs on the next run
+        waypoints = {to_state([config.map_size["height"] - 2, 1, 10])} | {
+            to_state([state[1], state[0], state[2]]) for state in target_states
+        }
+        self.incremental_planners = {
+            goal: planner
+            for goal, planner in self.incremental_planners.items()
+            if goal in waypoints
+        }
+        logger.debug(f"Mission search stats:\n{self.mission_stats.summary()}")
         self.bearing = Bearing.NORTH  # Reset bearing to North
-        self.displayMovement()  # TODO - this is removing my first element in self.simulator.robot_movement()
+        if display:
+            self.displayMovement()  # TODO - this is removing my first element in self.simulator.robot_movement()
 
     def displayMovement(self):
         if not self.simulator.robot_movement:
@@ -505,7 +625,8 @@ class Robot:
             self.reverse()
         elif movement == Movement.STOP:
             goal = self.simulator.temp_pairs.pop(0)
-            map_sim[goal[1]][goal[0]] = 1
+            self.map.grid[goal[1]][goal[0]] = 1
+            self.map.invalidate_clearance()
             time.sleep(0.5)
         self.simulator.update_map(full=True)
         # Refresh every 0.5 sec
@@ -0,0 +1,102 @@
+from dataclasses import dataclass, field
+from typing import List
+
+from path_find_algo import PathResult, ShortestPathTree
+from setup_logger import logger
+
+
+@dataclass
+class SearchStats:
+    """
+    Class to represent the work done by a single search - planning one leg, or building one shortest path tree
+
+    label says which search it was, e.g. the leg's start and end
+    nodes_expanded, nodes_generated and peak_open are the search's counters - see `PathResult`
+    cost is the cost of the path found, or 0 if there is none or the robot does not drive it (e.g. the search only
+    measured the cost between two waypoints), so that the costs of a mission add up to what the robot drives
+    elapsed_ns is the wall time spent on the search
+    """
+
+    label: str
+    nodes_expanded: int = 0
+    nodes_generated: int = 0
+    peak_open: int = 0
+    cost: int = 0
+    elapsed_ns: int = 0
+
+    @classmethod
+    def from_result(
+        cls, label: str, result: PathResult, elapsed_ns: int
+    ) -> "SearchStats":
+        """Builds the stats of a planned leg. `elapsed_ns` is measured by the caller, as the result may come from a
+        cache or a shortest path tree, in which case its counters are those of the search that first planned it
+        """
+        return cls(
+            label,
+            result.nodes_expanded,
+            result.nodes_generated,
+            result.peak_open,
+            result.cost if result.reached_goal else 0,
+            elapsed_ns,
+        )
+
+    @classmethod
+    def from_tree(cls, label: str, tree: ShortestPathTree) -> "SearchStats":
+        return cls(
+            label,
+            tree.nodes_expanded,
+            tree.nodes_generated,
+            tree.peak_open,
+            0,
+            tree.elapsed_ns,
+        )
+
+    def __str__(self) -> str:
+        return (
+            f"{self.label}: {self.elapsed_ns / 1e6:.2f} ms, expanded={self.nodes_expanded}, "
+            f"generated={self.nodes_generated}, peak_open={self.peak_open}, cost={self.cost}"
+        )
+
+
+@dataclass
+class MissionStats:
+    """
+    Class to represent the searches done for one mission, so the slowest ones can be found
+
+    Usage:
+        mission_stats = MissionStats()
+        mission_stats.record(SearchStats.from_result(label, result, elapsed_ns))
+        print(mission_stats.summary())
+    """
+
+    searches: List[SearchStats] = field(default_factory=list)
+
+    def record(self, stats: SearchStats) -> None:
+        logger.debug(f"Search stats - {stats}")
+        self.searches.append(stats)
+
+    @property
+    def total(self) -> SearchStats:
+        """Returns the sum of every search, where peak_open is the largest of any single search"""
+        return SearchStats(
+            "total",
+            sum(stats.nodes_expanded for stats in self.searches),
+            sum(stats.nodes_generated for stats in self.searches),
+            max((stats.peak_open for stats in self.searches), default=0),
+            sum(stats.cost for stats in self.searches),
+            sum(stats.elapsed_ns for stats in self.searches),
+        )
+
+    def hotspots(self, count: int = 3) -> List[SearchStats]:
+        """Returns the `count` searches that took the longest, slowest first"""
+        return sorted(self.searches, key=lambda stats: stats.elapsed_ns, reverse=True)[
+            :count
+        ]
+
+    def summary(self, count: int = 3) -> str:
+        """Returns a printable summary of the mission - the total, then the `count` slowest searches"""
+        if not self.searches:
+            return "No searches yet"
+        lines = [f"{len(self.searches)} searches", str(self.total), "Slowest:"]
+        lines.extend(str(stats) for stats in self.hotspots(count))
+        return "\n".join(lines)
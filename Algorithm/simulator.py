@@ -1,15 +1,18 @@
-import time
+import asyncio
+import concurrent.futures
+import queue
 import tkinter.ttk as ttk
 from bz2 import compress
 from tkinter import *
 from tkinter import scrolledtext
-from typing import Tuple
+from typing import Callable, Tuple
 
 import config
-from comms import Communication
+from comms import AsyncCommunication, BackgroundEventLoop
 from constants import *
 from map import *
 from robot import Robot
+from search_stats import MissionStats
 from setup_logger import logger
 
 
@@ -34,7 +37,11 @@ class Simulator:
         self.goal_pairs = []
         self.temp_pairs = []
         self.obstacles = []
-        self.communicate = Communication()
+        # RPi I/O runs on a background event loop, and hands every UI update back to the Tk thread through ui_calls
+        self.communicate = AsyncCommunication()
+        self.comms_loop = BackgroundEventLoop()
+        self.ui_calls: "queue.Queue[Callable[[], None]]" = queue.Queue()
+        self.mission: concurrent.futures.Future = None
         for i in range(3):
             self.robot_n.append([])
             self.robot_e.append([])
@@ -52,8 +59,8 @@ class Simulator:
 
         self.canvas = Canvas(
             self.root,
-            width=40 * config.map_size["width"],
-            height=40 * config.map_size["height"],
+            width=config.cell_size * config.map_size["width"],
+            height=config.cell_size * config.map_size["height"],
         )
         self.canvas.pack()
 
@@ -99,27 +106,100 @@ class Simulator:
         connect_button = ttk.Button(
             action_pane,
             text="Connect to RPI",
-            command=self.communicate.connect,
+            command=self.connect_to_rpi,
             width=30,
         )
         connect_button.grid(column=0, row=5, sticky="ew")
         disconnect_button = ttk.Button(
             action_pane,
             text="Disconnect to RPI",
-            command=self.communicate.disconnect,
+            command=self.disconnect_from_rpi,
             width=30,
         )
         disconnect_button.grid(column=0, row=6, sticky="ew")
         self.control_panel.columnconfigure(0, weight=1)
         self.control_panel.rowconfigure(0, weight=1)
         self.update_map(full=True)
+        self.root.after(config.ui_poll_ms, self.run_ui_calls)
         self.root.mainloop()
 
+    def run_ui_calls(self):
+        """Runs the UI updates queued by the background event loop, on the Tk thread"""
+        while True:
+            try:
+                call = self.ui_calls.get_nowait()
+            except queue.Empty:
+                break
+            call()
+        self.root.after(config.ui_poll_ms, self.run_ui_calls)
+
+    async def on_ui_thread(self, function: Callable, *args):
+        """Runs `function(*args)` on the Tk thread, and returns its result without blocking the event loop"""
+        future = concurrent.futures.Future()
+
+        def call():
+            # skip the call if the coroutine waiting for it was cancelled
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(function(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+        self.ui_calls.put(call)
+        return await asyncio.wrap_future(future)
+
+    def connect_to_rpi(self):
+        self.comms_loop.submit(self.communicate.connect())
+
+    def disconnect_from_rpi(self):
+        if self.mission is not None:
+            self.mission.cancel()
+        self.comms_loop.submit(self.communicate.disconnect())
+
     def android_map_formation(self):
-        self.obstacles = self.communicate.get_obstacles()
+        if self.mission is not None and not self.mission.done():
+            logger.warning(
+                "The previous map is still being run. Disconnect to cancel it"
+            )
+            return
+        self.mission = self.comms_loop.submit(self.run_mission())
+
+    def plan_mission(
+        self, obstacles: List[Obstacle]
+    ) -> Tuple[List[List[Movement]], List[List[int]]]:
+        """Plans the mission through `obstacles` on the Tk thread, and returns copies of what run_mission sends - the
+        movements towards each obstacle, and the (x, y) goal each of them ends at
+        """
+        self.obstacles = obstacles
         self.map.create_map(self.obstacles)
         self.reset()
-        self.robot.fastestPath(map_sim)
+        # the replay moves the same robot and uses up temp_pairs, so it only starts once the mission has been sent
+        self.robot.fastestPath(self.map.grid, display=False)
+        self.robot.reset()
+        return [list(movements) for movements in self.movement_to_rpi], [
+            list(goal) for goal in self.temp_pairs
+        ]
+
+    def move_robot(self, command: Callable[[], None]) -> Tuple[int, int, Bearing]:
+        """Moves the robot as the STM just did on the Tk thread, and returns its new (x, y, bearing)"""
+        command()
+        self.update_map()
+        return self.robot.x, self.robot.y, self.robot.bearing
+
+    def replay_mission(self):
+        self.robot.reset()
+        self.robot.displayMovement()
+
+    async def run_mission(self):
+        """Receives the obstacles from the RPi, plans the path through them, then sends it to the STM one movement at a
+        time. The UI keeps updating while waiting for the RPi, and the robot is redrawn as each movement is acknowledged.
+        Once the whole mission has been sent, it is replayed
+
+        Everything the Tk thread owns (the robot, the map and the plan) is only read and changed through `on_ui_thread`
+        """
+        obstacles = await self.communicate.get_obstacles(timeout=None)
+        movement_to_rpi, goals = await self.on_ui_thread(self.plan_mission, obstacles)
 
         movement_command = {
             Movement.FORWARD: self.robot.move,
@@ -128,11 +208,8 @@ class Simulator:
             Movement.RIGHT: self.robot.right,
         }
 
-        # Reset the robot position first
-        self.robot.reset()
-
         # Send the movements back to the client
-        for i, movement_to_obstacle in enumerate(self.movement_to_rpi):
+        for i, movement_to_obstacle in enumerate(movement_to_rpi):
             logger.debug(
                 f"Sending movement (one by one) towards obstacle {i} - {[movement.value for movement in movement_to_obstacle]}"
             )
@@ -142,34 +219,38 @@ class Simulator:
             for movement, count in movement_to_obstacle:
 
                 if movement in [Movement.FORWARD, Movement.REVERSE]:
-                    _direction, _count = movement.value[0], str(count * 10).zfill(3)
-                    self.send_movement_to_stm(
+                    # the distance is in cm - 10 per cell
+                    _direction, _count = movement.value[0], str(
+                        count * int(movement.value[1:])
+                    ).zfill(3)
+                    await self.send_movement_to_stm(
                         f"{_direction}{_count}", True
                     )  # ACK required
 
                     for _ in range(count):
-                        movement_command[movement]()
+                        pose = await self.on_ui_thread(
+                            self.move_robot, movement_command[movement]
+                        )
 
                 if movement in [Movement.LEFT, Movement.RIGHT]:
                     for _ in range(count):
-                        self.send_movement_to_stm(movement, True)  # ACK required
-                        movement_command[movement]()
+                        await self.send_movement_to_stm(movement, True)  # ACK required
+                        pose = await self.on_ui_thread(
+                            self.move_robot, movement_command[movement]
+                        )
 
                 # Send STOP (x), followed by image ID (IMG,<id>)
                 if movement in [Movement.STOP]:
-                    self.send_movement_to_stm(movement, False)  # ACK NOT required
-                    self.send_image_id_to_rpi(i)  # ACK NOT required
+                    await self.send_movement_to_stm(movement, False)  # ACK NOT required
+                    await self.send_image_id_to_rpi(
+                        goals[i], obstacles
+                    )  # ACK NOT required
 
                 # Update Android with robot's current coordinates ONLY if it moved
                 if movement != Movement.STOP:
-                    self.send_live_location_to_android()  # ACK NOT required
-
-        # Reset the robot so it moves corrctly in the ALgo UI
-        # Check the obstacle list before displaying movement
-        self.robot.reset()
+                    await self.send_live_location_to_android(pose)  # ACK NOT required
 
-        # Somehow the FIRST movement of the robot gets "eaten up" - compensate for it
-        movement_command[self.movement_to_rpi[0][0]]()
+        await self.on_ui_thread(self.replay_mission)
 
     def compress_movements(self, movements: List[str]) -> List[Tuple[Movement, int]]:
         """Compress the movements into a list of (Movement, count)
@@ -201,33 +282,35 @@ class Simulator:
         logger.debug(f"After compression: {compressed_movements}")
         return compressed_movements
 
-    def send_movement_to_stm(self, movement: Movement, require_ack: bool) -> bool:
-        while True:
-            if isinstance(movement, Movement):
-                movement = movement.value
+    async def send_movement_to_stm(self, movement: Movement, require_ack: bool) -> bool:
+        """Sends `movement` to the STM, then waits for its ACK for as long as the movement takes if `require_ack`
 
-            logger.debug(
-                f"[ALGO --> STM] Sending movement='{movement}' - require_ack = {require_ack}"
-            )
-            self.communicate.communicate(movement, listen=require_ack)
+        A movement is sent exactly once. The STM may still be executing it when it is slow to acknowledge, so sending it
+        again would move the robot twice, and its late ACK would be taken for the next movement's
+        """
+        if isinstance(movement, Movement):
+            movement = movement.value
 
-            if not require_ack:
-                break
+        logger.debug(
+            f"[ALGO --> STM] Sending movement='{movement}' - require_ack = {require_ack}"
+        )
+        await self.communicate.send_message(movement)
+        if not require_ack:
+            return True
 
-            # stop sending the same movement if STM acknowledges
-            if self.communicate.msg == Message.ACK.value:
+        while True:
+            reply = await self.communicate.receive_message(timeout=None)
+            if reply == Message.ACK.value:
                 logger.debug(f"[STM --> ALGO] Received ACK for movement='{movement}'")
-                self.communicate.msg = ""
-                break
-            else:
-                logger.debug(
-                    f"[STM --> ALGO] Missing ACK for movement='{movement}'. Sleeping and retrying in 1 second..."
-                )
-                time.sleep(1)
-
-        return True
+                return True
+            logger.debug(
+                f"[STM --> ALGO] Ignoring '{reply}' while waiting for the ACK of movement='{movement}'"
+            )
 
-    def send_live_location_to_android(self) -> bool:
+    async def send_live_location_to_android(
+        self, pose: Tuple[int, int, Bearing]
+    ) -> bool:
+        """Sends the robot's (x, y, bearing) `pose`, as returned by `move_robot`, to Android"""
         bearing_direction = {
             Bearing.NORTH: Direction.NORTH,
             Bearing.EAST: Direction.EAST,
@@ -235,40 +318,46 @@ class Simulator:
             Bearing.WEST: Direction.WEST,
         }
 
-        # (19 - y) to convert from arena's representation which treats bottom-left as (0,0)
+        # (height - 1 - y) to convert from arena's representation which treats bottom-left as (0,0)
         # to our representation which treats top-left as (0, 0)
-        x, y = self.robot.x, 19 - self.robot.y
-        direction = bearing_direction[self.robot.bearing].value
+        x, bearing = pose[0], pose[2]
+        y = config.map_size["height"] - 1 - pose[1]
+        # Android only shows cardinal directions
+        direction = bearing_direction[Bearing.to_cardinal(bearing)].value
         live_location = f"ROBOT,{x},{y},{direction}"
         logger.debug(
             f"[ALGO --> AND] Sending live_location='{live_location}' - require_ack=False"
         )
-        self.communicate.communicate(live_location, listen=False)
+        await self.communicate.communicate(live_location, listen=False)
         return True
 
-    def send_image_id_to_rpi(self, i: int) -> bool:
-        x, y = self.temp_pairs[i]
+    async def send_image_id_to_rpi(
+        self, goal: List[int], obstacles: List[Obstacle]
+    ) -> bool:
+        """Sends the ID of the obstacle at the (x, y) `goal` the robot stopped for"""
+        x, y = goal
 
-        for obstacle in self.obstacles:
+        for obstacle in obstacles:
             if obstacle.x == x and obstacle.y == y:
                 image_id = f"IMG,{obstacle.id}"
                 logger.debug(
                     f"[ALGO --> AND] Sending image_id='{image_id}' - require_ack=False"
                 )
-                self.communicate.communicate(image_id, listen=False)
+                await self.communicate.communicate(image_id, listen=False)
                 return True
 
-        logger.error(f"No image ID was found for i={i}")
+        logger.error(f"No image ID was found for goal={goal}")
         return False
 
     def findFP(self):
-        self.robot.fastestPath(map_sim)
+        self.robot.fastestPath(self.map.grid)
 
     def findFC(self):
         self.robot.fastestCar()
 
     def hamiltonian_path(self):
-        self.robot.hamiltonian_path_search(map_sim, self.goal_pairs)
+        self.robot.mission_stats = MissionStats()
+        self.robot.hamiltonian_path_search(self.map.grid, self.goal_pairs)
 
     def put_robot(self, x, y, bearing):
         if bearing == Bearing.NORTH:
@@ -288,6 +377,10 @@ class Simulator:
         else:
             front_coor = (x * 40 - 5, y * 40 - 5, x * 40 + 5, y * 40 + 5)
 
+        # the coordinates above are those of 40 pixel cells
+        front_coor = tuple(value * config.cell_size // 40 for value in front_coor)
+        cell = config.cell_size
+
         try:
             self.canvas.delete(self.robot_body)
             self.canvas.delete(self.robot_header)
@@ -295,10 +388,10 @@ class Simulator:
             pass
 
         self.robot_body = self.canvas.create_oval(
-            x * 40 - 20,
-            y * 40 - 20,
-            x * 40 + 60,
-            y * 40 + 60,
+            x * cell - cell // 2,
+            y * cell - cell // 2,
+            x * cell + cell * 3 // 2,
+            y * cell + cell * 3 // 2,
             fill="dodger blue",
             outline="",
         )
@@ -324,50 +417,55 @@ class Simulator:
                         self.canvas.itemconfig(
                             config.map_cells_1[y - 1 + i][x - 1 + j], fill=wall_c
                         )
-                        if not map_sim[y - 1 + i][x - 1 + j] in [
+                        if not self.map.grid[y - 1 + i][x - 1 + j] in [
                             10,
                             11,
                             12,
                             13,
                         ]:  # Skip the obstacle itself to prevent changes
                             # Update surrounding wall near the obstacle (3x3)
-                            map_sim[y - 1 + i][x - 1 + j] = wall
+                            self.map.grid[y - 1 + i][x - 1 + j] = wall
 
-        if map_sim[y][x] in [10, 11, 12, 13]:
+        if self.map.grid[y][x] in [10, 11, 12, 13]:
             if [x, y] not in self.temp_pairs:
                 self.temp_pairs.append([x, y])
-        elif map_sim[y][x] == 2:
+        elif self.map.grid[y][x] == 2:
             if [x, y] in self.temp_pairs:
                 self.temp_pairs.remove([x, y])
 
         direction = ""
         # Start box
-        if (17 <= y <= 19) and (0 <= x <= 2):
+        if (config.map_size["height"] - 3 <= y) and (0 <= x <= 2):
             color = "gold"
-        elif map_sim[y][x] in [0, 2]:
+        elif self.map.grid[y][x] in [0, 2]:
             color = "gray64"
             self.canvas.itemconfig(config.map_cells_2[y][x], text="")
-        elif map_sim[y][x] == 10:
+        elif self.map.grid[y][x] == 10:
             direction = "^"
             color = "magenta"
-        elif map_sim[y][x] == 11:
+        elif self.map.grid[y][x] == 11:
             direction = ">"
             color = "peach puff"
-        elif map_sim[y][x] == 12:
+        elif self.map.grid[y][x] == 12:
             direction = "v"
             color = "white"
-        elif map_sim[y][x] == 13:
+        elif self.map.grid[y][x] == 13:
             direction = "<"
             color = "chocolate1"
         else:
             color = "light pink"
 
         if not config.map_cells_1[y][x]:
+            cell = config.cell_size
             config.map_cells_1[y][x] = self.canvas.create_rectangle(
-                x * 40, y * 40, x * 40 + 40, y * 40 + 40, fill=color
+                x * cell, y * cell, x * cell + cell, y * cell + cell, fill=color
             )
             config.map_cells_2[y][x] = self.canvas.create_text(
-                x * 40 + 20, y * 40 + 20, text=direction, fill="black", font="bold"
+                x * cell + cell // 2,
+                y * cell + cell // 2,
+                text=direction,
+                fill="black",
+                font="bold",
             )
             self.canvas.bind("<ButtonPress-1>", self.on_click)
         else:
@@ -376,19 +474,18 @@ class Simulator:
                 self.canvas.itemconfig(
                     config.map_cells_2[y][x], text=direction, fill="black", font="bold"
                 )
-            elif map_sim[y][x] == 2:
+            elif self.map.grid[y][x] == 2:
                 wall_radius(0, "gray64")
-            self.text_area.delete("0.0", END)
-            self.text_area.insert("end", "Goals:\n" + str(self.temp_pairs), "\n")
+            self.update_text_area()
             self.canvas.itemconfig(config.map_cells_1[y][x], fill=color)
 
     def update_goal_pairs(self):
         for i in self.temp_pairs:
-            if map_sim[i[1]][i[0]] == 10:
+            if self.map.grid[i[1]][i[0]] == 10:
                 self.goal_pairs.append([i[0], i[1] - Distance.IMAGE_CAPTURE.value, 12])
-            elif map_sim[i[1]][i[0]] == 11:
+            elif self.map.grid[i[1]][i[0]] == 11:
                 self.goal_pairs.append([i[0] + Distance.IMAGE_CAPTURE.value, i[1], 13])
-            elif map_sim[i[1]][i[0]] == 12:
+            elif self.map.grid[i[1]][i[0]] == 12:
                 self.goal_pairs.append([i[0], i[1] + Distance.IMAGE_CAPTURE.value, 10])
             else:
                 self.goal_pairs.append([i[0] - Distance.IMAGE_CAPTURE.value, i[1], 11])
@@ -396,16 +493,17 @@ class Simulator:
         # TODO - let's ignore goal pairs that are OOB
         valid_goal_pairs = []
         valid_bearings = [10, 11, 12, 13]
+        width, height = config.map_size["width"], config.map_size["height"]
 
         for x, y, bearing in self.goal_pairs:
             x, y, bearing = int(x), int(y), int(bearing)
 
-            if 0 <= x <= 19 and 0 <= y <= 19 and bearing in valid_bearings:
+            if 0 <= x < width and 0 <= y < height and bearing in valid_bearings:
                 valid_goal_pairs.append([x, y, bearing])
             else:
-                if not (0 <= x <= 19):
+                if not (0 <= x < width):
                     logger.error(f"Goal pair {(x, y, bearing)} has invalid x={x}")
-                if not (0 <= y <= 19):
+                if not (0 <= y < height):
                     logger.error(f"Goal pair {(x, y, bearing)} has invalid y={y}")
                 if bearing not in valid_bearings:
                     logger.error(
@@ -417,21 +515,22 @@ class Simulator:
         self.goal_pairs = valid_goal_pairs
 
     def on_click(self, event):
-        x = event.x // 40
-        y = event.y // 40
-
-        if map_sim[y][x] == 0:
-            map_sim[y][x] = 10  # North
-        elif map_sim[y][x] == 10:
-            map_sim[y][x] = 11  # East
-        elif map_sim[y][x] == 11:
-            map_sim[y][x] = 12  # South
-        elif map_sim[y][x] == 12:
-            map_sim[y][x] = 13  # West
+        x = event.x // config.cell_size
+        y = event.y // config.cell_size
+
+        if self.map.grid[y][x] == 0:
+            self.map.grid[y][x] = 10  # North
+        elif self.map.grid[y][x] == 10:
+            self.map.grid[y][x] = 11  # East
+        elif self.map.grid[y][x] == 11:
+            self.map.grid[y][x] = 12  # South
+        elif self.map.grid[y][x] == 12:
+            self.map.grid[y][x] = 13  # West
         else:
-            map_sim[y][x] = 2  # Reset to 0 later
+            self.map.grid[y][x] = 2  # Reset to 0 later
 
         self.update_cell(x, y)
+        self.map.invalidate_clearance()
         self.goal_pairs = []
         self.update_goal_pairs()
 
@@ -464,9 +563,15 @@ class Simulator:
                     pass
 
         self.update_goal_pairs()
+        self.update_text_area()
+        self.put_robot(self.robot.x, self.robot.y, self.robot.bearing)
+
+    def update_text_area(self):
         self.text_area.delete("0.0", END)
         self.text_area.insert("end", "Goals:\n" + str(self.temp_pairs), "\n")
-        self.put_robot(self.robot.x, self.robot.y, self.robot.bearing)
+        self.text_area.insert(
+            "end", "\n\nSearch stats:\n" + self.robot.mission_stats.summary()
+        )
 
     def reset(self):
         if self.job:
@@ -0,0 +1,70 @@
+import random
+
+import numpy as np
+import pytest
+from arena_store import ArenaCorpus, save_arenas
+from constants import Obstacle
+from map import Map
+
+
+def random_arena(seed: int) -> Map:
+    rng = random.Random(seed)
+    arena = Map()
+    arena.create_map(
+        [
+            Obstacle(
+                i, rng.randrange(20), rng.randrange(20), rng.choice([10, 11, 12, 13])
+            )
+            for i in range(rng.randint(0, 8))
+        ]
+    )
+    return arena
+
+
+def test_arena_corpus_round_trips_arenas(tmp_path):
+    path = str(tmp_path / "arenas.bin")
+    arenas = [random_arena(seed) for seed in range(50)]
+
+    assert save_arenas(path, iter(arenas)) == 50
+    corpus = ArenaCorpus(path)
+
+    assert len(corpus) == 50
+    assert isinstance(corpus.records, np.memmap)
+    for arena, loaded in zip(arenas, corpus):
+        assert (loaded.grid == arena.grid).all()
+        assert loaded.obstacles == arena.obstacles
+        assert loaded.clearance().fingerprint == arena.clearance().fingerprint
+
+
+def test_arena_corpus_rejects_other_files(tmp_path):
+    path = tmp_path / "arenas.bin"
+    path.write_bytes(b"not an arena corpus")
+
+    with pytest.raises(ValueError):
+        ArenaCorpus(str(path))
+    with pytest.raises(ValueError):
+        save_arenas(str(path), [random_arena(0), Map(np.zeros((10, 10)))])
+
+
+def test_arena_corpus_sizes_records_for_the_most_obstacles(tmp_path):
+    path = str(tmp_path / "arenas.bin")
+    crowded = Map()
+    crowded.create_map(
+        [Obstacle(i, (i * 7) % 20, (i * 3) % 20, 10 + i % 4) for i in range(30)]
+    )
+    arenas = [random_arena(0), crowded]
+
+    assert save_arenas(path, iter(arenas)) == 2
+    corpus = ArenaCorpus(path)
+
+    assert corpus.max_obstacles == 30
+    assert [arena.obstacles for arena in corpus] == [
+        arena.obstacles for arena in arenas
+    ]
+    assert (corpus[1].grid == crowded.grid).all()
+
+    # with an explicit bound, the arenas are written as they are generated
+    assert save_arenas(path, iter(arenas), max_obstacles=40) == 2
+    assert ArenaCorpus(path).max_obstacles == 40
+    with pytest.raises(ValueError):
+        save_arenas(path, iter(arenas), max_obstacles=8)
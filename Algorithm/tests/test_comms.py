@@ -1,9 +1,11 @@
+import asyncio
 import concurrent.futures
 import socket
 import time
+from typing import Tuple
 
 import pytest
-from comms import Communication
+from comms import AsyncCommunication, BackgroundEventLoop, Communication
 from constants import Direction, Obstacle
 from setup_logger import logger
 
@@ -88,7 +90,7 @@ def test_get_obstacles(client: Communication, obstacles: str):
 
         # let the server receive the message first, since send is non-blocking
         # the actual sending of the buffered data over the TCP connection may NOT be finished by the time the send() method returns due to TCP flow control
-        server.send(obstacles.encode(client.msg_format))
+        server.send((obstacles + "\n").encode(client.msg_format))
         time.sleep(1)
         actual_obstacles = client.get_obstacles()
         expected_index, expected_x, expected_y, expected_direction = obstacles.split(
@@ -125,3 +127,126 @@ def test_get_obstacles(client: Communication, obstacles: str):
         client.disconnect()
         server.shutdown(socket.SHUT_RDWR)
         server.close()
+
+
+@pytest.mark.dependency(depends=["test_connect"])
+def test_listen_to_rpi_reassembles_messages(client: Communication):
+    try:
+        server = pytest.server_conn
+
+        # a message split across several sends, followed by two messages in a single send
+        server.send(b"A")
+        time.sleep(0.1)
+        server.send(b"CK")
+        time.sleep(0.1)
+        server.send(b"\nDONE\n\nACK\n")
+
+        received = []
+        for _ in range(3):
+            client.listen_to_rpi()
+            received.append(client.msg)
+        assert received == ["ACK", "DONE", "ACK"]
+        assert len(client.pending) == 0
+    except Exception as e:
+        pytest.fail(e)
+        client.disconnect()
+        server.shutdown(socket.SHUT_RDWR)
+        server.close()
+
+
+@pytest.mark.dependency(depends=["test_connect"])
+def test_send_message_ends_with_the_delimiter(client: Communication):
+    try:
+        server = pytest.server_conn
+
+        client.send_message("w010")
+        client.send_message("ROBOT,1,1,N")
+        time.sleep(0.1)
+
+        assert server.recv(1024) == b"w010\nROBOT,1,1,N\n"
+    except Exception as e:
+        pytest.fail(e)
+        client.disconnect()
+        server.shutdown(socket.SHUT_RDWR)
+        server.close()
+
+
+async def start_async_server(handle_client) -> Tuple[asyncio.AbstractServer, int]:
+    """Starts a mock RPi server on a free local port, which hands every connection to `handle_client`"""
+    server = await asyncio.start_server(handle_client, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def async_client(port: int) -> AsyncCommunication:
+    client = AsyncCommunication(timeout=1)
+    client.ipv4, client.port = "127.0.0.1", port
+    return client
+
+
+def test_async_client_receives_obstacles_and_acks():
+    received = []
+
+    async def handle_client(reader, writer):
+        writer.write(b"0,3,4,S\nAC")
+        await writer.drain()
+        # reply to the movement with the rest of the ACK
+        received.append(await reader.readuntil(b"\n"))
+        writer.write(b"K\n")
+        await writer.drain()
+
+    async def run():
+        server, port = await start_async_server(handle_client)
+        async with server:
+            client = async_client(port)
+            await client.connect()
+            obstacles = await client.get_obstacles()
+            reply = await client.communicate("w010")
+            await client.disconnect()
+        return obstacles, reply
+
+    obstacles, reply = asyncio.run(run())
+    assert obstacles == [Obstacle(0, 3, 19 - 4, 12)]
+    assert received == [b"w010\n"]
+    assert reply == "ACK"
+
+
+def test_async_client_times_out_and_can_be_cancelled():
+    async def handle_client(reader, writer):
+        await reader.read()  # never replies
+
+    async def run():
+        server, port = await start_async_server(handle_client)
+        async with server:
+            client = async_client(port)
+            await client.connect()
+            with pytest.raises(asyncio.TimeoutError):
+                await client.receive_message(timeout=0.1)
+
+            # the loop stays free while waiting, so the wait can be cancelled
+            listening = asyncio.ensure_future(client.communicate("w010"))
+            await asyncio.sleep(0.1)
+            listening.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await listening
+            await client.disconnect()
+
+    asyncio.run(run())
+
+
+def test_background_event_loop_runs_coroutines():
+    loop = BackgroundEventLoop()
+    try:
+        assert loop.submit(asyncio.sleep(0, result=42)).result(timeout=1) == 42
+
+        waiting = loop.submit(asyncio.sleep(10))
+        time.sleep(0.1)  # let the coroutine start first
+        waiting.cancel()
+        with pytest.raises(concurrent.futures.CancelledError):
+            waiting.result(timeout=1)
+
+        # coroutines still running when the loop stops are cancelled
+        left_running = loop.submit(asyncio.sleep(10))
+        time.sleep(0.1)
+    finally:
+        loop.stop()
+    assert left_running.cancelled()
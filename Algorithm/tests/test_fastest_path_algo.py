@@ -0,0 +1,147 @@
+import itertools
+import random
+import sys
+import time
+
+import pytest
+import config
+from fastest_path_algo import FastestPath, TourSolver
+
+
+def random_dist(n: int, seed: int):
+    rng = random.Random(seed)
+    return [
+        [sys.maxsize if i == j else rng.randint(10, 600) for j in range(n)]
+        for i in range(n)
+    ]
+
+
+def path_cost(dist, path) -> int:
+    return sum(dist[i][j] for i, j in zip(path, path[1:]))
+
+
+def brute_force_cost(dist, n: int) -> int:
+    return min(
+        path_cost(dist, (0, *order)) for order in itertools.permutations(range(1, n))
+    )
+
+
+@pytest.mark.parametrize(
+    "solver",
+    [
+        TourSolver.BRANCH_AND_BOUND,
+        TourSolver.PARALLEL_BRANCH_AND_BOUND,
+        TourSolver.HELD_KARP,
+        TourSolver.AUTO,
+    ],
+)
+@pytest.mark.parametrize("n", [1, 2, 3, 6, 7])
+def test_plan_path_is_optimal(solver: TourSolver, n: int):
+    dist = random_dist(n, seed=n)
+
+    path = [int(waypoint) for waypoint in FastestPath().plan_path(dist, n, solver)]
+
+    assert path[0] == 0
+    assert sorted(path) == list(range(n))
+    if n > 1:
+        assert path_cost(dist, path) == brute_force_cost(dist, n)
+
+
+def test_held_karp_solves_fifteen_waypoints():
+    dist = random_dist(15, seed=15)
+    fastest_path = FastestPath()
+
+    path = fastest_path.plan_path(dist, 15, TourSolver.HELD_KARP)
+
+    assert sorted(path) == list(range(15))
+    assert path_cost(dist, path) == fastest_path.min_cost
+
+
+@pytest.mark.parametrize("solver", list(TourSolver))
+def test_plan_path_returns_a_path_when_every_leg_is_expensive(solver: TourSolver):
+    dist = [[sys.maxsize if i == j else 20000 for j in range(5)] for i in range(5)]
+
+    path = [int(waypoint) for waypoint in FastestPath().plan_path(dist, 5, solver)]
+
+    assert sorted(path) == list(range(5))
+
+
+def test_two_opt_never_makes_the_path_worse():
+    dist = random_dist(9, seed=9)
+    fastest_path = FastestPath()
+    greedy = fastest_path.nearest_neighbour(dist, 9)
+
+    improved = fastest_path.two_opt(dist, greedy)
+
+    assert improved[0] == 0
+    assert sorted(improved) == list(range(9))
+    assert path_cost(dist, improved) <= path_cost(dist, greedy)
+
+
+def test_or_opt_never_makes_the_path_worse():
+    dist = random_dist(9, seed=19)
+    fastest_path = FastestPath()
+    greedy = fastest_path.nearest_neighbour(dist, 9)
+
+    improved = fastest_path.or_opt(dist, greedy)
+
+    assert improved[0] == 0
+    assert sorted(improved) == list(range(9))
+    assert path_cost(dist, improved) <= path_cost(dist, greedy)
+
+
+def test_auto_orders_a_full_arena_exactly():
+    # the start, and one waypoint per obstacle
+    n = 1 + config.exact_tour_max_waypoints
+    dist = random_dist(n, seed=n)
+    fastest_path = FastestPath()
+
+    path = fastest_path.plan_path(dist, n, TourSolver.AUTO)
+
+    assert fastest_path.mode == TourSolver.HELD_KARP
+    assert path[0] == 0
+    assert sorted(path) == list(range(n))
+
+
+def test_auto_switches_to_the_heuristic_within_its_time_budget():
+    n = config.exact_tour_max_waypoints + 25
+    dist = random_dist(n, seed=n)
+    fastest_path = FastestPath()
+
+    started = time.perf_counter()
+    path = fastest_path.plan_path(dist, n, TourSolver.AUTO)
+
+    assert time.perf_counter() - started < config.tour_time_budget + 0.5
+    assert fastest_path.mode == TourSolver.HEURISTIC
+    assert path[0] == 0
+    assert sorted(path) == list(range(n))
+    assert fastest_path.min_cost == path_cost(dist, path)
+    assert path_cost(dist, path) <= path_cost(
+        dist, fastest_path.nearest_neighbour(dist, n)
+    )
+
+
+@pytest.mark.parametrize("solver", list(TourSolver))
+def test_plan_path_follows_asymmetric_costs(solver: TourSolver):
+    # reaching waypoint 1 from waypoint 2 needs the robot to turn around, the other way round it does not
+    dist = [
+        [sys.maxsize, 50, 40],
+        [50, sys.maxsize, 10],
+        [40, 100, sys.maxsize],
+    ]
+
+    path = [int(waypoint) for waypoint in FastestPath().plan_path(dist, 3, solver)]
+
+    assert path == [0, 1, 2]
+
+
+def test_parallel_branch_and_bound_matches_held_karp():
+    dist = random_dist(11, seed=11)
+    parallel = FastestPath()
+    held_karp = FastestPath()
+
+    path = parallel.parallel_branch_and_bound(dist, 11, workers=2)
+    held_karp.plan_path(dist, 11, TourSolver.HELD_KARP)
+
+    assert sorted(path) == list(range(11))
+    assert path_cost(dist, path) == parallel.min_cost == held_karp.min_cost
@@ -0,0 +1,65 @@
+from constants import Cost
+from hierarchical_path_algo import HierarchicalPlanner
+from map import ClearanceMap
+from path_find_algo import SearchStatus, find_path, neighbours, to_state
+
+
+def test_hierarchical_planner_stays_close_to_astar():
+    maze = [[0 for _ in range(60)] for _ in range(60)]
+    for i in range(5, 55, 7):
+        maze[i][(i * 3) % 60] = 10
+        maze[(i * 5) % 60][i] = 13
+    clearance = ClearanceMap(maze)
+    planner = HierarchicalPlanner.for_clearance(clearance, Cost.MOVE_COST, 10)
+
+    assert HierarchicalPlanner.for_clearance(clearance, Cost.MOVE_COST, 10) is planner
+    for start, end in (([58, 1, 10], [1, 58, 11]), ([30, 2, 11], [33, 55, 13])):
+        expected = find_path(maze, Cost.MOVE_COST, start, end, [], clearance)
+        result = planner.plan(to_state(start), to_state(end))
+
+        assert result.status == SearchStatus.FOUND
+        assert expected.cost <= result.cost <= 1.2 * expected.cost
+        assert result.states[0] == to_state(start)
+        assert result.states[-1] == to_state(end)
+        # every movement takes the robot from one state to the next
+        for state, movement, following in zip(
+            result.states, result.movements, result.states[1:]
+        ):
+            assert (following, movement) in [
+                (position, step)
+                for position, _, step in neighbours(state, Cost.MOVE_COST, clearance)
+            ]
+
+
+def test_hierarchical_planner_reports_unreachable():
+    maze = [[0 for _ in range(40)] for _ in range(40)]
+    # the goal is boxed in by walls
+    for i in range(8):
+        maze[8][32 + i] = maze[i][32] = 1
+    clearance = ClearanceMap(maze)
+
+    result = HierarchicalPlanner(clearance, Cost.MOVE_COST, 10).plan(
+        to_state([38, 1, 10]), to_state([2, 36, 12])
+    )
+
+    assert result.status == SearchStatus.UNREACHABLE
+    assert result.states == [to_state([38, 1, 10])]
+
+
+def test_hierarchical_planner_connects_a_start_blocked_on_a_sector_border():
+    maze = [[0 for _ in range(12)] for _ in range(12)]
+    maze[10][3] = 13
+    clearance = ClearanceMap(maze)
+    start, end = [11, 4, 11], [7, 2, 10]
+    # the start is too close to the obstacle, and its own sector is blocked around it
+    assert not clearance.is_free(11, 4)
+
+    expected = find_path(maze, Cost.MOVE_COST, start, end, [], clearance)
+    result = HierarchicalPlanner(clearance, Cost.MOVE_COST, 5).plan(
+        to_state(start), to_state(end)
+    )
+
+    assert expected.status == result.status == SearchStatus.FOUND
+    assert result.cost == expected.cost
+    assert result.states[0] == to_state(start)
+    assert result.states[-1] == to_state(end)
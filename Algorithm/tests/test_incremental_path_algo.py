@@ -0,0 +1,81 @@
+from constants import Cost
+from incremental_path_algo import DStarLite
+from map import ClearanceMap
+from path_find_algo import ShortestPathTree, find_path, to_state
+
+
+def test_dstar_lite_repairs_after_obstacle_changes():
+    maze = [[0 for _ in range(20)] for _ in range(20)]
+    start, goal = [18, 1, 10], [2, 17, 11]
+    planner = DStarLite(
+        ClearanceMap(maze), Cost.MOVE_COST, to_state(start), to_state(goal)
+    )
+
+    first = planner.plan()
+    assert first.cost == find_path(maze, Cost.MOVE_COST, start, goal, []).cost
+
+    # block the middle of the cheapest path, then clear it again
+    middle = len(first.states) // 2
+    blocked_cells = first.states[middle - 1 : middle + 2]
+    for row, col, _ in blocked_cells:
+        maze[row][col] = 12
+    clearance = ClearanceMap(maze)
+    assert planner.update_clearance(clearance) > 0
+    repaired = planner.plan()
+
+    expected = find_path(maze, Cost.MOVE_COST, start, goal, [], clearance)
+    assert repaired.cost == expected.cost
+    assert repaired.states[0] == to_state(start)
+    assert repaired.states[-1] == to_state(goal)
+    assert all(clearance.is_free(row, col) for row, col, _ in repaired.states)
+
+    for row, col, _ in blocked_cells:
+        maze[row][col] = 0
+    planner.update_clearance(ClearanceMap(maze))
+    assert planner.plan().cost == first.cost
+
+    # an obstacle away from the path only needs a small repair
+    maze[10][10] = 10
+    clearance = ClearanceMap(maze)
+    planner.update_clearance(clearance)
+    repaired = planner.plan()
+
+    expected = find_path(maze, Cost.MOVE_COST, start, goal, [], clearance)
+    assert repaired.cost == expected.cost
+    assert repaired.nodes_expanded < expected.nodes_expanded
+
+
+def test_dstar_lite_picks_up_a_shortest_path_tree():
+    maze = [[0 for _ in range(20)] for _ in range(20)]
+    start, goal = [18, 1, 10], [2, 17, 11]
+    tree = ShortestPathTree(
+        ClearanceMap(maze), Cost.MOVE_COST, to_state(goal), [to_state(start)]
+    )
+    planner = DStarLite.from_tree(tree, Cost.MOVE_COST, to_state(start))
+
+    # the tree already settled the start, so there is nothing left to search
+    first = planner.plan()
+    assert first.cost == tree.cost_to(to_state(start))
+    assert first.nodes_expanded == 0
+    assert first.states[0] == to_state(start)
+    assert first.states[-1] == to_state(goal)
+
+    middle = len(first.states) // 2
+    for row, col, _ in first.states[middle - 1 : middle + 2]:
+        maze[row][col] = 12
+    clearance = ClearanceMap(maze)
+    planner.update_clearance(clearance)
+    repaired = planner.plan()
+
+    expected = find_path(maze, Cost.MOVE_COST, start, goal, [], clearance)
+    assert repaired.cost == expected.cost
+    assert all(clearance.is_free(row, col) for row, col, _ in repaired.states)
+
+    # the robot starts the leg somewhere else
+    planner.update_start(to_state([18, 3, 11]))
+    moved = planner.plan()
+    assert moved.states[0] == to_state([18, 3, 11])
+    assert (
+        moved.cost
+        == find_path(maze, Cost.MOVE_COST, [18, 3, 11], goal, [], clearance).cost
+    )
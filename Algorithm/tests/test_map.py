@@ -0,0 +1,102 @@
+import config
+import map as map_module
+import numpy as np
+from constants import Obstacle
+from map import ClearanceMap, Map, map_sim
+
+
+def test_clearance_map_blocks_footprint_and_separation():
+    maze = [[0 for _ in range(20)] for _ in range(20)]
+    maze[10][10] = 11
+    clearance = ClearanceMap(maze)
+
+    # the robot's 3x3 footprint would overlap the obstacle
+    assert not clearance.footprint_is_free(9, 9)
+    assert clearance.footprint_is_free(8, 8)
+
+    # the robot must stay at least Distance.MIN_SEPARATION cells away vertically and horizontally
+    assert not clearance.is_free(10, 13)
+    assert not clearance.is_free(7, 10)
+    assert clearance.is_free(10, 14)
+    assert clearance.is_free(6, 10)
+    assert clearance.is_free(8, 8)
+
+    # out of bounds
+    assert not clearance.is_free(-1, 0)
+    assert not clearance.is_free(0, 20)
+
+
+def test_clearance_map_includes_android_obstacles():
+    maze = [[0 for _ in range(20)] for _ in range(20)]
+    clearance = ClearanceMap(maze, [Obstacle(0, 3, 5, 10)])
+
+    assert not clearance.is_free(5, 3)
+    assert not clearance.is_free(2, 3)
+    assert clearance.is_free(1, 3)
+
+
+def test_create_map_stamps_obstacles_and_reset_restores_them():
+    arena = Map()
+    # an obstacle in the corner, and one whose border touches another obstacle
+    arena.create_map(
+        [Obstacle(0, 0, 0, 12), Obstacle(1, 5, 5, 10), Obstacle(2, 7, 5, 11)]
+    )
+
+    assert arena.grid[0, 0] == 12
+    assert (arena.grid[:2, :2] == [[12, 1], [1, 1]]).all()
+    assert arena.grid[5, 5] == 10 and arena.grid[5, 7] == 11
+    assert (arena.grid[4:7, 4:9] == [[1] * 5, [1, 10, 1, 11, 1], [1] * 5]).all()
+    assert np.count_nonzero(arena.grid) == 4 + 15
+    assert arena.is_obstacle(5, 7) and not arena.is_valid_open(4, 4)
+    assert arena.is_valid_open(10, 10)
+
+    arena.grid[10, 10] = 13
+    arena.reset()
+    assert arena.grid[10, 10] == 0
+    assert (arena.grid == arena.virtual).all()
+
+
+def test_maps_do_not_share_state():
+    first, second = Map(), Map()
+    first.create_map([Obstacle(0, 10, 10, 11)])
+    clearance = second.clearance()
+
+    assert (second.grid == map_sim).all()
+    assert not second.is_obstacle(10, 10)
+    assert second.clearance() is clearance
+
+    second.create_map([Obstacle(0, 3, 3, 10)])
+    assert first.is_obstacle(10, 10) and not first.is_obstacle(3, 3)
+    assert first.clearance().fingerprint != second.clearance().fingerprint
+
+
+def test_map_follows_the_configured_arena_size(monkeypatch):
+    monkeypatch.setitem(config.map_size, "height", 50)
+    monkeypatch.setitem(config.map_size, "width", 40)
+    arena = Map()
+    arena.create_map([Obstacle(0, 39, 49, 13), Obstacle(1, 40, 10, 10)])
+
+    assert arena.grid.shape == (50, 40)
+    assert np.count_nonzero(arena.grid) == 4
+    assert arena.is_obstacle(49, 39)
+    assert arena.valid_range(49, 39) and not arena.valid_range(10, 40)
+
+
+def test_create_map_builds_the_clearance_once_it_is_needed(monkeypatch):
+    built = []
+
+    class CountingClearanceMap(ClearanceMap):
+        def __init__(self, *args):
+            built.append(args)
+            super().__init__(*args)
+
+    monkeypatch.setattr(map_module, "ClearanceMap", CountingClearanceMap)
+    arena = Map()
+    # as Simulator.plan_mission does
+    arena.create_map([Obstacle(0, 10, 10, 11)])
+    arena.reset()
+
+    assert not built
+    assert not arena.clearance().is_free(10, 10)
+    assert arena.clearance() is arena.clearance()
+    assert len(built) == 1
@@ -0,0 +1,331 @@
+from typing import List
+
+import pytest
+from constants import Bearing, Cost, Movement, Obstacle
+from map import ClearanceMap
+from path_find_algo import (
+    DIAGONAL_OFFSETS,
+    CostToGo,
+    MotionPrimitives,
+    Primitive,
+    SearchEngine,
+    SearchStatus,
+    ShortestPathTree,
+    find_path,
+    heuristic,
+    search,
+    to_state,
+)
+
+
+@pytest.fixture()
+def empty_maze() -> List[List[int]]:
+    """
+    Returns:
+        List[List[int]]: A 20x20 arena with no obstacles
+    """
+    return [[0 for _ in range(20)] for _ in range(20)]
+
+
+def path_length(path: List[List[int]]) -> int:
+    return max(max(row) for row in path)
+
+
+def test_search_straight_line(empty_maze: List[List[int]]):
+    path = search(empty_maze, 10, [18, 1, 10], [10, 1, 10], [])
+
+    assert path_length(path) == 8
+    for step, row in enumerate(range(18, 9, -1)):
+        assert path[row][1] == step
+
+
+def test_find_path_returns_states_and_movements(empty_maze: List[List[int]]):
+    result = find_path(empty_maze, Cost.MOVE_COST, [18, 1, 10], [16, 3, 11], [])
+
+    assert result.reached_goal
+    assert result.states[0] == (18, 1, Bearing.NORTH)
+    assert result.states[-1] == (16, 3, Bearing.EAST)
+    assert len(result.movements) == len(result.states) - 1
+    assert result.movements.count(Movement.RIGHT) == 1
+    assert result.cost == 4 * Cost.MOVE_COST + Cost.TURN_COST
+    assert result.to_matrix(empty_maze)[16][3] == 4
+
+
+def test_search_keeps_clear_of_obstacles(empty_maze: List[List[int]]):
+    obstacles = [Obstacle(0, 1, 10, 12)]
+    for row in range(9, 12):
+        for col in range(0, 3):
+            empty_maze[row][col] = 1
+    empty_maze[10][1] = 12
+
+    path = search(empty_maze, 10, [18, 1, 10], [2, 1, 10], obstacles)
+
+    assert path[2][1] >= 0
+    for row in range(20):
+        for col in range(20):
+            if path[row][col] >= 0:
+                assert empty_maze[row][col] == 0
+                assert not (col == 1 and abs(row - 10) < 4)
+                assert not (row == 10 and abs(col - 1) < 4)
+
+
+def test_heuristic_counts_moves_and_turns():
+    goal = (10, 5, Bearing.EAST)
+
+    # facing the goal bearing, on the same row - moves only
+    assert heuristic((10, 1, Bearing.EAST), goal, Cost.MOVE_COST) == 4 * Cost.MOVE_COST
+    # reversing into the goal is allowed, but the robot must still turn around
+    assert (
+        heuristic((10, 9, Bearing.WEST), goal, Cost.MOVE_COST)
+        == 4 * Cost.MOVE_COST + 2 * Cost.TURN_COST
+    )
+    # displacement along both axes needs at least one turn
+    assert (
+        heuristic((18, 1, Bearing.NORTH), goal, Cost.MOVE_COST)
+        == 12 * Cost.MOVE_COST + Cost.TURN_COST
+    )
+
+
+def test_shortest_path_tree_matches_find_path(empty_maze: List[List[int]]):
+    empty_maze[10][10] = 10
+    clearance = ClearanceMap(empty_maze)
+    source = to_state([18, 1, 10])
+    goals = [to_state([6, 10, 12]), to_state([2, 17, 11]), to_state([15, 15, 13])]
+
+    tree = ShortestPathTree(clearance, Cost.MOVE_COST, source, goals)
+
+    for goal in goals:
+        expected = find_path(
+            empty_maze,
+            Cost.MOVE_COST,
+            [18, 1, 10],
+            [goal[0], goal[1], 10 + goal[2] // 2],
+            [],
+            clearance,
+        )
+        assert tree.cost_to(goal) == expected.cost
+        assert tree.path_to(goal).states[-1] == goal
+        assert tree.path_to(goal).cost == expected.cost
+
+
+def test_shortest_path_tree_on_large_arena():
+    maze = [[0 for _ in range(120)] for _ in range(100)]
+    for row in range(10, 90, 20):
+        maze[row][60] = 13
+    clearance = ClearanceMap(maze)
+    source, goal = to_state([98, 1, 10]), to_state([1, 118, 11])
+
+    tree = ShortestPathTree(clearance, Cost.MOVE_COST, source, [goal])
+    expected = find_path(maze, Cost.MOVE_COST, [98, 1, 10], [1, 118, 11], [], clearance)
+
+    assert tree.cost_to(goal) == expected.cost
+    assert tree.path_to(goal).states[0] == source
+    assert tree.path_to(goal).movements == expected.movements
+    assert tree.cost_to((100, 0, Bearing.NORTH)) is None
+    assert not tree.resolves((100, 0, Bearing.NORTH))
+
+
+def test_jump_point_search_matches_astar(empty_maze: List[List[int]]):
+    empty_maze[9][9] = 13
+    empty_maze[4][15] = 12
+    clearance = ClearanceMap(empty_maze)
+
+    astar = find_path(
+        empty_maze, Cost.MOVE_COST, [18, 1, 10], [2, 18, 11], [], clearance
+    )
+    jps = find_path(
+        empty_maze,
+        Cost.MOVE_COST,
+        [18, 1, 10],
+        [2, 18, 11],
+        [],
+        clearance,
+        SearchEngine.JPS,
+    )
+
+    assert jps.cost == astar.cost
+    assert jps.nodes_expanded < astar.nodes_expanded
+    assert len(jps.movements) == len(jps.states) - 1
+    assert all(clearance.is_free(row, col) for row, col, _ in jps.states)
+
+
+def test_bidirectional_search_matches_astar(empty_maze: List[List[int]]):
+    empty_maze[5][12] = 12
+    empty_maze[12][6] = 11
+    clearance = ClearanceMap(empty_maze)
+
+    astar = find_path(
+        empty_maze, Cost.MOVE_COST, [18, 1, 10], [1, 18, 12], [], clearance
+    )
+    bidirectional = find_path(
+        empty_maze,
+        Cost.MOVE_COST,
+        [18, 1, 10],
+        [1, 18, 12],
+        [],
+        clearance,
+        SearchEngine.BIDIRECTIONAL,
+    )
+
+    assert bidirectional.cost == astar.cost
+    assert bidirectional.states[0] == (18, 1, Bearing.NORTH)
+    assert bidirectional.states[-1] == (1, 18, Bearing.SOUTH)
+    assert len(bidirectional.movements) == len(bidirectional.states) - 1
+    assert all(clearance.is_free(row, col) for row, col, _ in bidirectional.states)
+
+
+def test_bidirectional_search_reports_found_once_the_searches_meet(
+    empty_maze: List[List[int]],
+):
+    for row, col, direction in [(4, 15, 12), (6, 7, 10), (8, 5, 10), (8, 8, 11)]:
+        empty_maze[row][col] = direction
+    optimal = find_path(
+        empty_maze,
+        Cost.MOVE_COST,
+        [18, 1, 10],
+        [1, 18, 12],
+        [],
+        engine=SearchEngine.BIDIRECTIONAL,
+    )
+
+    # the budget runs out after the searches have met, but before the meeting is proven to be the cheapest
+    result = find_path(
+        empty_maze,
+        Cost.MOVE_COST,
+        [18, 1, 10],
+        [1, 18, 12],
+        [],
+        engine=SearchEngine.BIDIRECTIONAL,
+        node_budget=optimal.nodes_expanded - 1,
+    )
+
+    assert result.status == SearchStatus.FOUND
+    assert result.states[-1] == (1, 18, Bearing.SOUTH)
+    assert result.cost >= optimal.cost
+
+
+@pytest.mark.parametrize("engine", list(SearchEngine))
+def test_weighted_search_stays_within_epsilon(
+    empty_maze: List[List[int]], engine: SearchEngine
+):
+    empty_maze[8][6] = 11
+    empty_maze[12][14] = 13
+    clearance = ClearanceMap(empty_maze)
+
+    optimal = find_path(
+        empty_maze, Cost.MOVE_COST, [18, 1, 10], [1, 18, 12], [], clearance, engine
+    )
+    weighted = find_path(
+        empty_maze,
+        Cost.MOVE_COST,
+        [18, 1, 10],
+        [1, 18, 12],
+        [],
+        clearance,
+        engine,
+        epsilon=2.0,
+    )
+
+    assert weighted.status == SearchStatus.FOUND
+    assert weighted.cost <= 2.0 * optimal.cost
+    assert weighted.nodes_expanded <= optimal.nodes_expanded
+
+
+@pytest.mark.parametrize("engine", list(SearchEngine))
+def test_search_reports_budget_exhausted_and_unreachable(
+    empty_maze: List[List[int]], engine: SearchEngine
+):
+    result = find_path(
+        empty_maze,
+        Cost.MOVE_COST,
+        [18, 1, 10],
+        [1, 18, 12],
+        [],
+        engine=engine,
+        node_budget=3,
+    )
+
+    assert result.status == SearchStatus.BUDGET_EXHAUSTED
+    assert not result.reached_goal
+    assert result.nodes_expanded <= 3
+    assert result.states[0] == (18, 1, Bearing.NORTH)
+    assert len(result.movements) == len(result.states) - 1
+
+    # the goal is boxed in by walls
+    for i in range(5):
+        empty_maze[4][15 + i] = empty_maze[i][15] = 1
+    result = find_path(
+        empty_maze, Cost.MOVE_COST, [18, 1, 10], [1, 18, 12], [], engine=engine
+    )
+
+    assert result.status == SearchStatus.UNREACHABLE
+    assert result.states == [(18, 1, Bearing.NORTH)]
+    assert search(empty_maze, Cost.MOVE_COST, [18, 1, 10], [1, 18, 12], []) is None
+
+
+def test_cost_to_go_is_exact_and_guides_search(empty_maze: List[List[int]]):
+    empty_maze[9][9] = 10
+    empty_maze[14][4] = 12
+    clearance = ClearanceMap(empty_maze)
+    goal = to_state([2, 17, 11])
+    cost_to_go = CostToGo.for_goal(clearance, goal, Cost.MOVE_COST)
+
+    assert CostToGo.for_goal(clearance, goal, Cost.MOVE_COST) is cost_to_go
+    assert cost_to_go(goal) == 0
+
+    for start in ([18, 1, 10], [10, 15, 13], [4, 2, 12]):
+        plain = find_path(empty_maze, Cost.MOVE_COST, start, [2, 17, 11], [], clearance)
+        guided = find_path(
+            empty_maze,
+            Cost.MOVE_COST,
+            start,
+            [2, 17, 11],
+            [],
+            clearance,
+            cost_to_go=cost_to_go,
+        )
+
+        assert cost_to_go(to_state(start)) == plain.cost
+        assert guided.cost == plain.cost
+        # only the states on the path (and their ties) are expanded
+        assert guided.nodes_expanded <= plain.nodes_expanded
+        assert guided.nodes_expanded <= 2 * len(guided.states)
+
+
+def test_motion_primitives_shorten_the_path(empty_maze: List[List[int]]):
+    empty_maze[10][10] = 11
+    clearance = ClearanceMap(empty_maze)
+    lattice = find_path(
+        empty_maze, Cost.MOVE_COST, [18, 1, 10], [2, 17, 11], [], clearance
+    )
+    primitives = MotionPrimitives(diagonal=True, arc_radius=2)
+
+    result = find_path(
+        empty_maze,
+        Cost.MOVE_COST,
+        [18, 1, 10],
+        [2, 17, 11],
+        [],
+        clearance,
+        primitives=primitives,
+    )
+
+    assert result.reached_goal
+    assert result.cost < lattice.cost
+    assert len(result.movements) == len(result.states) - 1
+    # the primitives are not STM commands
+    assert any(isinstance(movement, Primitive) for movement in result.movements)
+    assert not set(Primitive.__members__) & set(Movement.__members__)
+    assert all(clearance.is_free(row, col) for row, col, _ in result.states)
+
+    # every movement takes the robot from one state to the next
+    for (row, col, bearing), movement, following in zip(
+        result.states, result.movements, result.states[1:]
+    ):
+        if movement in (Primitive.FORWARD_DIAG, Primitive.REVERSE_DIAG):
+            d_row, d_col = DIAGONAL_OFFSETS[bearing]
+            sign = 1 if movement == Primitive.FORWARD_DIAG else -1
+            assert following == (row + sign * d_row, col + sign * d_col, bearing)
+        elif movement in (Primitive.ARC_LEFT, Primitive.ARC_RIGHT):
+            d_row, d_col = primitives.arc_offset(bearing, movement)
+            assert following[:2] == (row + d_row, col + d_col)
@@ -0,0 +1,69 @@
+from constants import Cost, Obstacle
+from map import ClearanceMap, Map
+from path_find_algo import find_path
+from plan_cache import MISSING, LegCache, leg_cache
+
+
+def test_leg_cache_evicts_least_recently_used():
+    cache = LegCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", None)
+
+    assert cache.get("a") == 1  # "b" is now the least recently used
+    cache.put("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("b", MISSING) is MISSING
+    assert cache.get("c") == 3
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_find_path_reuses_cached_leg():
+    maze = [[0 for _ in range(20)] for _ in range(20)]
+    maze[8][8] = 11
+    clearance = ClearanceMap(maze)
+    leg_cache.clear()
+
+    first = find_path(maze, Cost.MOVE_COST, [18, 1, 10], [8, 13, 13], [], clearance)
+    hits = leg_cache.hits
+    second = find_path(
+        maze, Cost.MOVE_COST, [18, 1, 10], [8, 13, 13], [], ClearanceMap(maze)
+    )
+
+    assert leg_cache.hits == hits + 1
+    assert second is first
+
+
+def test_replacing_an_arena_drops_only_its_cached_legs():
+    first, second = Map(), Map()
+    first.create_map([Obstacle(0, 8, 8, 11)])
+    second.create_map([Obstacle(0, 12, 4, 10)])
+    leg_cache.clear()
+    for arena in (first, second):
+        find_path(
+            arena.grid, Cost.MOVE_COST, [18, 1, 10], [1, 18, 11], [], arena.clearance()
+        )
+    assert len(leg_cache) == 2
+
+    # rebuilding the same arena keeps its legs
+    first.create_map([Obstacle(0, 8, 8, 11)])
+    first.clearance()
+    assert len(leg_cache) == 2
+
+    first.create_map([Obstacle(0, 3, 3, 10)])
+    assert len(leg_cache) == 1
+    second.grid[10, 10] = 12
+    second.invalidate_clearance()
+    find_path(
+        second.grid, Cost.MOVE_COST, [18, 1, 10], [1, 18, 11], [], second.clearance()
+    )
+    assert len(leg_cache) == 2
+
+    # the legs of the restored arena are still valid
+    second.reset()
+    assert len(leg_cache) == 1
+    hits = leg_cache.hits
+    find_path(
+        second.grid, Cost.MOVE_COST, [18, 1, 10], [1, 18, 11], [], second.clearance()
+    )
+    assert leg_cache.hits == hits + 1
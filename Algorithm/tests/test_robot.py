@@ -0,0 +1,163 @@
+from types import SimpleNamespace
+
+import config
+from constants import Bearing, Movement, Obstacle
+from hierarchical_path_algo import HierarchicalPlanner
+from map import Map
+import robot as robot_module
+from robot import Robot
+
+
+def make_robot() -> Robot:
+    """Returns a robot driven by a stand-in for the simulator, which only holds what the planner reads and writes"""
+    simulator = SimpleNamespace(
+        map=Map(),
+        obstacles=[],
+        goal_pairs=[],
+        temp_pairs=[],
+        robot_movement=[],
+        robot_temp_movement=[],
+        movement_to_rpi=[],
+    )
+    return Robot(simulator)
+
+
+def test_get_target_movement_turns_from_any_bearing():
+    robot = make_robot()
+
+    robot.get_target_movement(Bearing.NORTH, Bearing.WEST)
+    assert robot.robot_rpi_temp_movement == [Movement.LEFT]
+    assert robot.bearing == Bearing.WEST
+
+
+def test_mission_stats_count_the_tour_cost_once():
+    robot = make_robot()
+    robot.displayMovement = lambda: None
+    robot.simulator.obstacles = [Obstacle(0, 5, 5, 12), Obstacle(1, 14, 12, 13)]
+    robot.map.create_map(robot.simulator.obstacles)
+    # the waypoints the robot photographs the obstacles from, as [x, y, direction]
+    robot.simulator.goal_pairs = [[5, 9, 10], [10, 12, 11]]
+
+    robot.fastestPath(robot.map.grid)
+
+    legs = [
+        stats for stats in robot.mission_stats.searches if stats.label.startswith("leg")
+    ]
+    assert len(legs) == 2
+    assert all(stats.cost > 0 for stats in legs)
+    assert robot.mission_stats.total.cost == sum(stats.cost for stats in legs)
+
+
+def test_hierarchical_arenas_still_order_waypoints_with_shortest_path_trees(
+    monkeypatch,
+):
+    monkeypatch.setattr(config, "hierarchical_min_cells", 0)
+    robot = make_robot()
+    robot.displayMovement = lambda: None
+    robot.simulator.obstacles = [Obstacle(0, 5, 5, 12), Obstacle(1, 14, 12, 13)]
+    robot.map.create_map(robot.simulator.obstacles)
+    robot.simulator.goal_pairs = [[5, 9, 10], [10, 12, 11]]
+
+    robot.fastestPath(robot.map.grid)
+
+    searches = robot.mission_stats.searches
+    # one tree from the start and each of the 2 waypoints, which also serve the driven legs
+    assert len([stats for stats in searches if stats.label.startswith("tree")]) == 3
+    legs = [stats for stats in searches if stats.label.startswith("leg")]
+    assert len(legs) == 2 and all(stats.cost > 0 for stats in legs)
+    assert not any(
+        isinstance(derived, HierarchicalPlanner)
+        for derived in robot.map.clearance().derived.values()
+    )
+
+
+def test_unreachable_waypoints_are_visited_last_on_large_arenas(monkeypatch):
+    monkeypatch.setitem(config.map_size, "height", 100)
+    monkeypatch.setitem(config.map_size, "width", 100)
+    robot = make_robot()
+    robot.displayMovement = lambda: None
+    robot.simulator.obstacles = [Obstacle(0, 50, 46, 12), Obstacle(1, 90, 10, 12)]
+    robot.map.create_map(robot.simulator.obstacles)
+    # the waypoint in front of the first obstacle is walled in
+    robot.map.grid[44:56, 44] = robot.map.grid[44:56, 56] = 1
+    robot.map.grid[44, 44:57] = robot.map.grid[55, 44:57] = 1
+    robot.map.invalidate_clearance()
+    robot.simulator.goal_pairs = [[50, 50, 10], [90, 14, 10]]
+
+    robot.fastestPath(robot.map.grid)
+
+    # the reachable leg costs more than any fixed penalty for the walled in waypoint would have
+    assert robot.mission_stats.total.cost > 1000
+    assert robot.simulator.temp_pairs == [[90, 10], [50, 46]]
+
+
+def test_display_movement_rebuilds_the_clearance_after_marking_a_goal(monkeypatch):
+    robot = make_robot()
+    robot.simulator.update_map = lambda full: None
+    robot.simulator.root = SimpleNamespace(after=lambda ms, callback: None)
+    monkeypatch.setattr(robot_module.time, "sleep", lambda seconds: None)
+    robot.map.create_map([])
+    clearance = robot.map.clearance()
+    robot.simulator.robot_movement = [Movement.STOP]
+    robot.simulator.temp_pairs = [[10, 10]]
+
+    robot.displayMovement()
+
+    assert robot.map.grid[10, 10] == 1
+    assert robot.map.clearance() is not clearance
+    assert not robot.map.clearance().is_free(10, 10)
+
+
+def test_fastest_path_repairs_the_previous_run_after_an_obstacle_moves():
+    robot = make_robot()
+    robot.displayMovement = lambda: None
+    robot.simulator.obstacles = [Obstacle(0, 5, 5, 12), Obstacle(1, 14, 12, 13)]
+    robot.map.create_map(robot.simulator.obstacles)
+    robot.simulator.goal_pairs = [[5, 9, 10], [10, 12, 11]]
+    robot.fastestPath(robot.map.grid)
+    first_trees = set(robot.shortest_path_trees)
+
+    # an obstacle is added between the waypoints, which stay where they were
+    obstacles = robot.simulator.obstacles + [Obstacle(2, 8, 11, 12)]
+    robot.simulator.obstacles = obstacles
+    robot.simulator.robot_movement, robot.simulator.movement_to_rpi = [], []
+    robot.map.create_map(obstacles)
+    # fastestPath puts the start in front of the goal pairs, so they are set again like the simulator does
+    robot.simulator.goal_pairs = [[5, 9, 10], [10, 12, 11]]
+    robot.fastestPath(robot.map.grid)
+
+    # every waypoint repairs its search from the previous run instead of growing a new tree
+    assert set(robot.incremental_planners) == first_trees
+    assert not robot.shortest_path_trees
+    labels = [stats.label for stats in robot.mission_stats.searches]
+    assert not any(label.startswith("tree") for label in labels)
+    assert len([label for label in labels if label.startswith("repair")]) == 3
+    planners = dict(robot.incremental_planners)
+
+    fresh = make_robot()
+    fresh.displayMovement = lambda: None
+    fresh.simulator.obstacles = obstacles
+    fresh.map.create_map(obstacles)
+    fresh.simulator.goal_pairs = [[5, 9, 10], [10, 12, 11]]
+    fresh.fastestPath(fresh.map.grid)
+    assert robot.simulator.temp_pairs == fresh.simulator.temp_pairs
+    assert robot.mission_stats.total.cost == fresh.mission_stats.total.cost
+    # equally cheap paths may differ, but every leg costs what a search from scratch finds
+    assert [
+        stats.cost
+        for stats in robot.mission_stats.searches
+        if stats.label.startswith("leg")
+    ] == [
+        stats.cost
+        for stats in fresh.mission_stats.searches
+        if stats.label.startswith("leg")
+    ]
+
+    # the same planners are repaired again on the next run
+    robot.map.create_map(robot.simulator.obstacles[:2])
+    robot.simulator.goal_pairs = [[5, 9, 10], [10, 12, 11]]
+    robot.fastestPath(robot.map.grid)
+    assert all(
+        robot.incremental_planners[goal] is planner
+        for goal, planner in planners.items()
+    )
@@ -0,0 +1,36 @@
+from constants import Cost
+from path_find_algo import SearchEngine, find_path
+from search_stats import MissionStats, SearchStats
+
+
+def test_find_path_reports_search_counters():
+    maze = [[0 for _ in range(20)] for _ in range(20)]
+    maze[9][9] = 12
+
+    for engine in SearchEngine:
+        result = find_path(
+            maze, Cost.MOVE_COST, [18, 1, 10], [1, 18, 12], [], engine=engine
+        )
+
+        assert result.nodes_expanded > 0
+        assert result.nodes_generated >= result.nodes_expanded
+        assert 0 < result.peak_open <= result.nodes_generated
+        assert result.elapsed_ns > 0
+
+
+def test_mission_stats_totals_and_hotspots():
+    mission_stats = MissionStats()
+    assert mission_stats.summary() == "No searches yet"
+
+    mission_stats.record(SearchStats("fast", 10, 30, 12, 100, 1_000))
+    mission_stats.record(SearchStats("slow", 50, 90, 40, 300, 9_000))
+    mission_stats.record(SearchStats("medium", 20, 40, 25, 200, 5_000))
+
+    total = mission_stats.total
+    assert total.nodes_expanded == 80
+    assert total.nodes_generated == 160
+    assert total.peak_open == 40
+    assert total.cost == 600
+    assert total.elapsed_ns == 15_000
+    assert [stats.label for stats in mission_stats.hotspots(2)] == ["slow", "medium"]
+    assert "slow" in mission_stats.summary()
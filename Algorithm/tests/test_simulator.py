@@ -0,0 +1,44 @@
+import asyncio
+
+from comms import AsyncCommunication
+from constants import Bearing, Movement
+from simulator import Simulator
+
+
+def make_simulator(client: AsyncCommunication) -> Simulator:
+    """Returns a simulator without its Tk window, which is all the RPi exchange needs"""
+    simulator = Simulator.__new__(Simulator)
+    simulator.communicate = client
+    return simulator
+
+
+def test_send_movement_to_stm_sends_once_and_waits_for_its_ack():
+    received = []
+
+    async def handle_client(reader, writer):
+        received.append(await reader.readuntil(b"\n"))
+        # a message for someone else, then an ACK slower than the client's timeout
+        writer.write(b"ROBOT,1,1,N\n")
+        await writer.drain()
+        await asyncio.sleep(1.5)
+        writer.write(b"$\n")
+        await writer.drain()
+        received.append(await reader.read())
+
+    async def run():
+        server = await asyncio.start_server(handle_client, "127.0.0.1", 0)
+        async with server:
+            client = AsyncCommunication(timeout=1)
+            client.ipv4, client.port = server.sockets[0].getsockname()
+            await client.connect()
+            simulator = make_simulator(client)
+            acknowledged = await simulator.send_movement_to_stm(Movement.FORWARD, True)
+            await simulator.send_live_location_to_android((1, 18, Bearing.NORTH_EAST))
+            await client.disconnect()
+            await asyncio.sleep(0.1)
+        return acknowledged
+
+    assert asyncio.run(run())
+    assert received[0] == b"w010\n"
+    # the movement was not sent again, and the pose was snapped to a cardinal bearing
+    assert received[1] == b"ROBOT,1,1,N\n"